@@ -1,79 +1,451 @@
+import os
+import time
+import shutil
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import re
+import corpus_store
 
-# Load your dataset (replace 'sonipat-pdf-data.csv' with your actual file path if needed)
-data = pd.read_csv('./combined_dataset.csv')
+DEFAULT_INPUT = './combined_dataset.csv'
+DEFAULT_OUTPUT = 'combined-classified.csv'
+# Columns read from a corpus store input; anything else stored there is skipped
+INPUT_COLUMNS = [corpus_store.DISTRICT, 'PDF Name', 'Extracted Text']
+# Dropped from the output with --drop-text
+TEXT_COLUMNS = ['Extracted Text', 'cleaned_doc']
+# Rows per chunk handed to each worker when --workers is set without --chunksize
+WORKER_CHUNK_ROWS = 500
+# Rows of the previous output read at a time when --incremental keeps them
+CARRY_ROWS = 5000
+STAGES = ['read', 'clean', 'extract', 'write']
 
-# Print the column names to check the structure
-print("Column Names:", data.columns)
+# Keywords are checked in priority order against the lowercased document; the
+# first one found wins, so order matters (e.g. "fraudulent" before "valid").
+VEHICLE_TYPES = [(vehicle, vehicle) for vehicle in
+                 ['car', 'truck', 'bike', 'motorcycle', 'bus', 'scooter', 'auto-rickshaw']]
+CLAIM_STATUSES = [('approved', 'Approved'), ('denied', 'Denied'), ('rejected', 'Denied'), ('pending', 'Pending')]
+INVESTIGATION_OUTCOMES = [('fraudulent', 'Fraudulent'), ('valid', 'Valid')]
+RELATIONSHIPS = [('self', 'Self'), ('spouse', 'Spouse'), ('friend', 'Friend')]
+
+CLAIM_AMOUNT_PATTERN = re.compile(r'Rs\.?\s?\d+(?:,\d{3})*(?:\.\d{2})?')  # Pattern for "Rs. 10,000.00"
+SIMILAR_CLAIMS_PATTERN = re.compile(r'similar claims:?\s?(\d+)', re.IGNORECASE)
+# IGNORECASE matching is an order of magnitude slower than a plain search of the
+# lowercased text, which finds the same match unless the text contains one of
+# the non-ASCII letters IGNORECASE also folds onto 'i' or 's'.
+SIMILAR_CLAIMS_LOWERED_PATTERN = re.compile(r'similar claims:?\s?(\d+)')
+CASE_FOLD_EXTRAS = '\u0130\u0131\u017f'
 
 # Cleaning function to remove newlines and extra spaces
 def clean_text(text):
-    text = re.sub(r'\n+', ' ', text)  # Remove newline characters
-    text = re.sub(r'\s+', ' ', text)  # Remove multiple spaces
-    return text.strip()  # Remove leading and trailing spaces
+    return ' '.join(text.split())  # Collapse every whitespace run (newlines included) to one space
+
+def first_keyword(lowered, keywords):
+    for keyword, label in keywords:
+        if keyword in lowered:
+            return label
+    return "Unknown"
 
-# Apply the cleaning function to the 'Extracted Text' column
-data['cleaned_doc'] = data['Extracted Text'].apply(lambda x: clean_text(x) if isinstance(x, str) else '')
+# Every extractor takes the cleaned text and its lowercased copy, so a document
+# is only lowercased once however many extractors look at it.
 
 # Define function to extract Claim Amount (monetary values in Rs.)
-def extract_claim_amount(text):
-    amounts = re.findall(r'Rs\.?\s?\d+(?:,\d{3})*(?:\.\d{2})?', text)  # Pattern for "Rs. 10,000.00"
-    return amounts[0] if amounts else "Unknown"
+def extract_claim_amount(text, lowered):
+    match = CLAIM_AMOUNT_PATTERN.search(text)
+    return match.group() if match else "Unknown"
 
 # Define function to extract Vehicle Type
-def extract_vehicle_type(text):
-    vehicle_types = ['car', 'truck', 'bike', 'motorcycle', 'bus', 'scooter', 'auto-rickshaw']
-    for vehicle in vehicle_types:
-        if vehicle in text.lower():
-            return vehicle
-    return "Unknown"
+def extract_vehicle_type(text, lowered):
+    return first_keyword(lowered, VEHICLE_TYPES)
 
 # Define function to extract Claim Status (approved, denied, pending)
-def extract_claim_status(text):
-    if "approved" in text.lower():
-        return "Approved"
-    elif "denied" in text.lower() or "rejected" in text.lower():
-        return "Denied"
-    elif "pending" in text.lower():
-        return "Pending"
-    return "Unknown"
+def extract_claim_status(text, lowered):
+    return first_keyword(lowered, CLAIM_STATUSES)
 
 # Define function to extract Insurer Investigation Outcome (valid, fraudulent)
-def extract_insurer_investigation_outcome(text):
-    if "fraudulent" in text.lower():
-        return "Fraudulent"
-    elif "valid" in text.lower():
-        return "Valid"
-    return "Unknown"
+def extract_insurer_investigation_outcome(text, lowered):
+    return first_keyword(lowered, INVESTIGATION_OUTCOMES)
 
 # Define function to extract Relationship to Vehicle Owner
-def extract_relationship_to_owner(text):
-    if "self" in text.lower():
-        return "Self"
-    elif "spouse" in text.lower():
-        return "Spouse"
-    elif "friend" in text.lower():
-        return "Friend"
-    return "Unknown"
+def extract_relationship_to_owner(text, lowered):
+    return first_keyword(lowered, RELATIONSHIPS)
 
 # Define function to extract Similar Claims Count
-def extract_similar_claims_count(text):
-    match = re.search(r'similar claims:?\s?(\d+)', text, re.IGNORECASE)
+def extract_similar_claims_count(text, lowered):
+    if any(letter in text for letter in CASE_FOLD_EXTRAS):
+        match = SIMILAR_CLAIMS_PATTERN.search(text)
+    else:
+        match = SIMILAR_CLAIMS_LOWERED_PATTERN.search(lowered)
     return int(match.group(1)) if match else "Unknown"
 
-# Apply the extraction functions to the cleaned document text
-data['ClaimAmount'] = data['cleaned_doc'].apply(extract_claim_amount)
-data['VehicleType'] = data['cleaned_doc'].apply(extract_vehicle_type)
-data['ClaimStatus'] = data['cleaned_doc'].apply(extract_claim_status)
-data['InsurerInvestigationOutcome'] = data['cleaned_doc'].apply(extract_insurer_investigation_outcome)
-data['RelationshipToOwner'] = data['cleaned_doc'].apply(extract_relationship_to_owner)
-data['SimilarClaimsCount'] = data['cleaned_doc'].apply(extract_similar_claims_count)
-
-# Display the extracted results
-print(data[['ClaimAmount', 'VehicleType', 'ClaimStatus', 
-           'InsurerInvestigationOutcome', 'RelationshipToOwner', 
-           'SimilarClaimsCount']].head())
-
-# Save the results to a new CSV file
-data.to_csv('combined-classified.csv', index=False)
+FEATURE_EXTRACTORS = {
+    'ClaimAmount': extract_claim_amount,
+    'VehicleType': extract_vehicle_type,
+    'ClaimStatus': extract_claim_status,
+    'InsurerInvestigationOutcome': extract_insurer_investigation_outcome,
+    'RelationshipToOwner': extract_relationship_to_owner,
+    'SimilarClaimsCount': extract_similar_claims_count,
+}
+FEATURE_COLUMNS = list(FEATURE_EXTRACTORS)
+
+# Bump a column's version whenever its extractor's output changes; an
+# --incremental run then recomputes just that column for every document.
+EXTRACTOR_VERSIONS = {column: 1 for column in FEATURE_COLUMNS}
+# Sidecar next to the output, one row per output row: PDF Name, the hash of its
+# Extracted Text and the extractor version each feature column was computed with.
+MANIFEST_KEY = ['PDF Name', 'text_sha256']
+
+def manifest_path_for(output_csv):
+    root, _ = os.path.splitext(output_csv)
+    return root + '.manifest.csv'
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest() if isinstance(text, str) else ''
+
+def clean_documents(texts):
+    """Cleaned copy of a text column; missing documents become ''."""
+    return pd.Series([clean_text(x) if isinstance(x, str) else '' for x in texts], index=texts.index)
+
+def extract_features(docs):
+    """Run every extractor over a column of cleaned documents in a single pass."""
+    rows = [[extract(text, lowered) for extract in FEATURE_EXTRACTORS.values()]
+            for text, lowered in zip(docs, docs.str.lower())]
+    return pd.DataFrame(rows, columns=FEATURE_COLUMNS, index=docs.index, dtype=object)
+
+def classify(data, timings=None):
+    """Add cleaned_doc and the feature columns to a frame with an 'Extracted Text' column.
+
+    If timings is a dict, the seconds spent cleaning and extracting are added to it.
+    """
+    start = time.perf_counter()
+    data['cleaned_doc'] = clean_documents(data['Extracted Text'])
+    cleaned = time.perf_counter()
+    features = extract_features(data['cleaned_doc'])
+    for column in FEATURE_COLUMNS:
+        data[column] = features[column]
+    if timings is not None:
+        timings['clean'] = timings.get('clean', 0.0) + cleaned - start
+        timings['extract'] = timings.get('extract', 0.0) + time.perf_counter() - cleaned
+    return data
+
+def reclassify(data, stale, timings=None):
+    """Recompute only the feature cells flagged in the boolean frame stale.
+
+    data carries the previous results. Every row is cleaned again, since
+    cleaned_doc is written back for all of them and cleaning is cheap next to
+    keeping the previous output's text in memory.
+    """
+    start = time.perf_counter()
+    rows = stale.any(axis=1).to_numpy()
+    cleaned_doc = clean_documents(data['Extracted Text']).to_numpy(dtype=object)
+    data['cleaned_doc'] = cleaned_doc
+    cleaned = time.perf_counter()
+    flags = stale[FEATURE_COLUMNS].to_numpy()
+    values = [data[column].to_numpy(dtype=object, na_value=None) for column in FEATURE_COLUMNS]
+    extractors = list(FEATURE_EXTRACTORS.values())
+    for row in rows.nonzero()[0]:
+        text = cleaned_doc[row]
+        lowered = text.lower()
+        for k in flags[row].nonzero()[0]:
+            values[k][row] = extractors[k](text, lowered)
+    for column, column_values in zip(FEATURE_COLUMNS, values):
+        data[column] = column_values
+    if timings is not None:
+        timings['clean'] = timings.get('clean', 0.0) + cleaned - start
+        timings['extract'] = timings.get('extract', 0.0) + time.perf_counter() - cleaned
+    return data
+
+def prepare_chunk(chunk, previous=None):
+    """Fingerprint a chunk's documents and, given earlier results, attach them.
+
+    Returns (chunk, stale) where stale flags the feature cells to recompute, or
+    None when the whole chunk needs classifying.
+    """
+    chunk['text_sha256'] = [text_sha256(text) for text in chunk['Extracted Text']]
+    if previous is None:
+        return chunk, None
+    chunk = chunk.merge(previous, on=MANIFEST_KEY, how='left')
+    stale = pd.DataFrame({column: chunk.pop(column + '_version') != str(version)
+                          for column, version in EXTRACTOR_VERSIONS.items()})
+    return chunk, stale
+
+def classify_chunk(job, drop_text=False):
+    """Classify one prepared chunk (runs in pool workers).
+
+    Returns the output rows, their manifest rows and the stage timings.
+    """
+    chunk, stale = job
+    timings = {}
+    if stale is None:
+        chunk = classify(chunk, timings)
+    else:
+        chunk = reclassify(chunk, stale, timings)
+    manifest = chunk[MANIFEST_KEY].assign(**{column: version for column, version in EXTRACTOR_VERSIONS.items()})
+    columns = [column for column in chunk.columns if column not in ['text_sha256', 'cleaned_doc'] + FEATURE_COLUMNS]
+    chunk = chunk[columns + ['cleaned_doc'] + FEATURE_COLUMNS]
+    if drop_text:
+        chunk = chunk.drop(columns=TEXT_COLUMNS)
+    return chunk, manifest, timings
+
+def load_previous_store(output, districts=None):
+    """load_previous for a corpus store output, which keeps its manifest columns inline."""
+    if not os.path.isdir(output):
+        return None
+    versions = [column + '_version' for column in FEATURE_COLUMNS]
+    present = corpus_store.schema_columns(output)
+    if not set(MANIFEST_KEY) <= set(present):
+        return None
+    # Projection skips the text columns, which are the bulk of the store
+    wanted = MANIFEST_KEY + FEATURE_COLUMNS + versions
+    filters = [(corpus_store.DISTRICT, 'in', list(districts))] if districts else None
+    previous = corpus_store.read(output, columns=[column for column in wanted if column in present], filters=filters)
+    for column, version in zip(FEATURE_COLUMNS, versions):
+        if column not in previous.columns:
+            previous[column] = None
+        previous[version] = previous[version].astype(str) if version in previous.columns else ''
+    return previous.drop_duplicates(MANIFEST_KEY)
+
+def load_previous(output_csv, districts=None):
+    """Last run's features and extractor versions, for merging on MANIFEST_KEY; None if there is no output.
+
+    Only the key, feature and version columns are read, so memory does not grow
+    with the text. Raises ValueError if a CSV output has no matching manifest.
+    """
+    if corpus_store.is_store(output_csv):
+        return load_previous_store(output_csv, districts)
+    if not os.path.exists(output_csv):
+        return None
+    manifest_csv = manifest_path_for(output_csv)
+    if not os.path.exists(manifest_csv):
+        raise ValueError(f"{output_csv} has no manifest ({manifest_csv})")
+    # Read as text so reused values are written back exactly as they were
+    header = pd.read_csv(output_csv, nrows=0).columns
+    columns = ['PDF Name'] + [column for column in FEATURE_COLUMNS if column in header]
+    output = pd.read_csv(output_csv, usecols=columns, dtype=str, keep_default_na=False)
+    manifest = pd.read_csv(manifest_csv, dtype=str, keep_default_na=False)
+    if len(output) != len(manifest) or not output['PDF Name'].equals(manifest['PDF Name']):
+        raise ValueError(f"{manifest_csv} does not match {output_csv}")
+    previous = manifest[MANIFEST_KEY].copy()
+    for column in FEATURE_COLUMNS:
+        previous[column] = output[column] if column in output.columns else None
+        previous[column + '_version'] = manifest[column] if column in manifest.columns else ''
+    return previous.drop_duplicates(MANIFEST_KEY)
+
+def classify_chunks(chunks, workers=1, drop_text=False):
+    """Yield (classified chunk, timings) in input order, across a process pool when workers > 1."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield classify_chunk(chunk, drop_text)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a couple of chunks per worker in flight so memory stays bounded;
+        # taking results from the front of the queue preserves input order.
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(classify_chunk, chunk, drop_text))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def timed(iterable, timings, stage):
+    """Pass items through, adding the time spent producing them to timings[stage]."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[stage] += time.perf_counter() - start
+        yield item
+
+def iter_chunks(sources, chunksize=None, districts=None, with_district=False):
+    """Yield frames from CSVs or corpus stores; with chunksize, at most that many rows at a time.
+
+    districts limits the input to those districts (pushed down into store scans;
+    a CSV counts as the district its file is named after). with_district adds
+    that name as a district column to CSV input.
+    """
+    for source in sources:
+        if corpus_store.is_store(source):
+            filters = [(corpus_store.DISTRICT, 'in', list(districts))] if districts else None
+            yield from corpus_store.iter_frames(source, INPUT_COLUMNS, filters, chunksize)
+            continue
+        district = corpus_store.district_name(source)
+        if districts and district not in districts:
+            continue
+        if with_district:
+            frames = iter_chunks([source], chunksize)
+            for frame in frames:
+                frame.insert(0, corpus_store.DISTRICT, district)
+                yield frame
+        elif chunksize:
+            yield from pd.read_csv(source, chunksize=chunksize)
+        else:
+            yield pd.read_csv(source)
+
+def skip_documents(chunks, names):
+    """Drop rows whose PDF Name is in names, e.g. the near-duplicates of a document kept elsewhere."""
+    for chunk in chunks:
+        chunk = chunk[~chunk['PDF Name'].isin(names)]
+        if len(chunk):
+            yield chunk
+
+def carry_csv(output_csv, seen, columns, manifest_columns):
+    """Yield (rows, manifest rows) of the previous CSV output whose PDF Name is not in seen.
+
+    Read a chunk at a time, as text, and aligned to the new output's columns.
+    """
+    outputs = pd.read_csv(output_csv, dtype=str, keep_default_na=False, chunksize=CARRY_ROWS)
+    manifests = pd.read_csv(manifest_path_for(output_csv), dtype=str, keep_default_na=False, chunksize=CARRY_ROWS)
+    for output, manifest in zip(outputs, manifests):
+        keep = ~output['PDF Name'].isin(seen).to_numpy()
+        output, manifest = output[keep], manifest[keep]
+        if columns is not None:
+            output, manifest = output.reindex(columns=columns), manifest.reindex(columns=manifest_columns)
+        if len(output):
+            yield output, manifest
+
+def carry_store(output, seen, district, columns):
+    """Frames of one district of the previous store output whose PDF Name is not in seen."""
+    filters = [(corpus_store.DISTRICT, '==', district)]
+    for frame in corpus_store.iter_frames(output, filters=filters, batch_size=CARRY_ROWS):
+        frame = frame[~frame['PDF Name'].isin(seen)]
+        if len(frame):
+            yield frame.reindex(columns=[column for column in columns if column != corpus_store.DISTRICT])
+
+def classify_stream(chunks, output_csv, drop_text=False, workers=1, incremental=False, prune=False, districts=None):
+    """Classify frames in order into output_csv and its manifest.
+
+    output_csv may also be a corpus store, partitioned by the frames' district
+    column, which keeps the manifest columns (text_sha256, <feature>_version)
+    alongside the features instead of in a separate file. Only the districts
+    the frames cover are rewritten; the store's other districts are left as
+    they are.
+
+    With incremental, documents whose PDF Name and text hash match the previous
+    output keep their results and only columns whose extractor version changed
+    are recomputed. Earlier rows for documents the input does not cover are
+    kept (for a store, within the districts rewritten), unless prune is set.
+    Both files are written under a temporary name and swapped in at the end.
+    Returns the row count, the number of documents that needed any extraction,
+    the number of earlier rows kept, and seconds per stage; with workers > 1
+    the clean and extract figures are summed over the workers.
+    """
+    manifest_csv = manifest_path_for(output_csv)
+    store = corpus_store.is_store(output_csv)
+    previous = None
+    if incremental:
+        try:
+            previous = load_previous(output_csv, districts)
+        except ValueError as e:
+            if not prune:
+                raise ValueError(f"{e}; rerun with --prune to rebuild it from --input alone") from e
+            print(f"{e}; reclassifying everything")
+    # Earlier rows can only be carried over together with their manifest rows
+    carry = incremental and not prune and (os.path.isdir(output_csv) if store else previous is not None)
+    tmp = output_csv + '.tmp'
+    if store:
+        # Left over from an interrupted run
+        shutil.rmtree(tmp, ignore_errors=True)
+    timings = dict.fromkeys(STAGES, 0.0)
+    rows = 0
+    changed = 0
+    kept = 0
+    stale_counts = []
+    # PDF Names the input covered, per district for a store
+    seen = {}
+    columns = manifest_columns = None
+    def jobs():
+        for chunk in timed(chunks, timings, 'read'):
+            chunk, stale = prepare_chunk(chunk, previous)
+            stale_counts.append(len(chunk) if stale is None else int(stale.any(axis=1).sum()))
+            yield chunk, stale
+    results = classify_chunks(jobs(), workers, drop_text)
+    for i, (chunk, manifest, chunk_timings) in enumerate(results):
+        for stage, seconds in chunk_timings.items():
+            timings[stage] += seconds
+        start = time.perf_counter()
+        if i == 0:
+            # Print the column names to check the structure, and the first extracted results
+            print("Column Names:", chunk.columns)
+            print(chunk[FEATURE_COLUMNS].head())
+        if store:
+            versions = {column + '_version': manifest[column].to_numpy() for column in FEATURE_COLUMNS}
+            chunk = chunk.assign(text_sha256=manifest['text_sha256'].to_numpy(), **versions)
+            if corpus_store.DISTRICT not in chunk.columns:
+                chunk.insert(0, corpus_store.DISTRICT, corpus_store.district_name(output_csv))
+            corpus_store.write_frame(tmp, chunk)
+            for district, names in chunk.groupby(corpus_store.DISTRICT, sort=False)['PDF Name']:
+                seen.setdefault(district, set()).update(names)
+        else:
+            chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            manifest.to_csv(manifest_csv + '.tmp', mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            seen.setdefault(None, set()).update(chunk['PDF Name'])
+        if columns is None:
+            columns, manifest_columns = list(chunk.columns), list(manifest.columns)
+        rows += len(chunk)
+        changed += stale_counts[i]
+        timings['write'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    if carry and store:
+        for district in seen:
+            for frame in carry_store(output_csv, seen[district], district, columns):
+                corpus_store.write_frame(tmp, frame, district)
+                kept += len(frame)
+    elif carry:
+        for output, manifest in carry_csv(output_csv, seen.get(None, set()), columns, manifest_columns):
+            first = rows + kept == 0
+            output.to_csv(tmp, mode='w' if first else 'a', header=first, index=False)
+            manifest.to_csv(manifest_csv + '.tmp', mode='w' if first else 'a', header=first, index=False)
+            kept += len(output)
+    timings['write'] += time.perf_counter() - start
+
+    if store and rows:
+        # Swap in only the districts this run wrote
+        for district in seen:
+            os.makedirs(output_csv, exist_ok=True)
+            corpus_store.replace(corpus_store.district_dir(tmp, district), corpus_store.district_dir(output_csv, district))
+        shutil.rmtree(tmp, ignore_errors=True)
+    elif rows + kept:
+        os.replace(tmp, output_csv)
+        os.replace(manifest_csv + '.tmp', manifest_csv)
+    return rows + kept, changed, kept, timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract claim features from scraped PDF text.")
+    parser.add_argument('--input', nargs='+', default=[DEFAULT_INPUT],
+                        help="CSV(s) with an 'Extracted Text' column, e.g. the per-district *-pdf-data.csv "
+                             "files, or corpus store directories")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="CSV file, or a corpus store directory")
+    parser.add_argument('--district', nargs='+', help="only classify these districts")
+    parser.add_argument('--chunksize', type=int,
+                        help="stream the input this many rows at a time instead of loading it whole")
+    parser.add_argument('--drop-text', action='store_true', help="leave the raw and cleaned text out of the output")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="classify chunks in this many processes; output keeps the input order")
+    parser.add_argument('--incremental', action='store_true',
+                        help="reuse results from the existing output for unchanged documents and extractors, "
+                             "keeping its rows for documents not in --input")
+    parser.add_argument('--prune', action='store_true',
+                        help="with --incremental, drop earlier rows for documents not in --input "
+                             "(for a store, within the districts written)")
+    parser.add_argument('--dedup', metavar='MAPPING_CSV',
+                        help="near_duplicates.py output; only the canonical document of each cluster is classified")
+    args = parser.parse_args()
+
+    chunksize = args.chunksize or (WORKER_CHUNK_ROWS if args.workers > 1 else None)
+    start = time.perf_counter()
+    chunks = iter_chunks(args.input, chunksize, args.district, corpus_store.is_store(args.output))
+    if args.dedup:
+        from near_duplicates import load_duplicates
+        chunks = skip_documents(chunks, load_duplicates(args.dedup))
+    rows, changed, kept, timings = classify_stream(chunks, args.output, args.drop_text, args.workers,
+                                                   args.incremental, args.prune, args.district)
+    print(f"Classified {rows} documents ({changed} new or changed, {kept} kept from the previous output) "
+          f"into {args.output} in {time.perf_counter() - start:.2f}s")
+    print("Stage timings: " + ", ".join(f"{stage} {timings[stage]:.2f}s" for stage in STAGES))
@@ -1,24 +1,144 @@
-import pandas as pd
+import os
+import csv
+import shutil
 import glob
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import corpus_store
+import source_manifest
 
 # Define the path to your CSV files
-csv_files = glob.glob(r"D:\HackRX\pdf-scraper\*.csv")
+SOURCE_GLOB = r"D:\HackRX\pdf-scraper\*.csv"
+# A CSV file, or a corpus store directory partitioned by district
+OUTPUT_PATH = r"D:\HackRX\pdf-scraper\combined_dataset.csv"
+COLUMNS = ['PDF Name', 'Extracted Text']
+CHUNK_ROWS = 1000  # source rows read at a time
+
+# Sources already combined, one row each; later rows win. A source whose size
+# and mtime (or, failing that, sha256) match is skipped on the next run.
+SOURCE_FIELDS = ['path', 'size', 'mtime_ns', 'sha256', 'rows']
+# Placeholder text the scrapers write for unreadable PDFs; these rows are
+# deduplicated by name as well, since the text alone says nothing about the document.
+PLACEHOLDER_PREFIXES = ("No text could be extracted", "Failed to process due to error")
+
+def sidecar_paths(output_path):
+    root, _ = os.path.splitext(os.path.normpath(output_path))
+    return root + '.sources.csv', root + '.hashes'
+
+class HashSet:
+    """Append-only set of 64-bit document hashes kept in a flat binary file (8 bytes per document).
+
+    Hashes from earlier runs are held as one sorted array; ones added this run
+    go to a small in-memory set and are appended to the file as they arrive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._sorted = np.unique(np.fromfile(path, dtype='<u8')) if os.path.exists(path) else np.empty(0, '<u8')
+        self._added = set()
+        self._file = open(path, 'ab')
+
+    def __contains__(self, value):
+        i = np.searchsorted(self._sorted, value)
+        return (i < len(self._sorted) and self._sorted[i] == value) or value in self._added
+
+    def __len__(self):
+        return len(self._sorted) + len(self._added)
+
+    def add_many(self, values):
+        self._added.update(values)
+        np.asarray(values, dtype='<u8').tofile(self._file)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def document_hash(name, text):
+    """64-bit content hash of a document; placeholder or missing text also keys on the name."""
+    if not isinstance(text, str) or not text.strip() or text.startswith(PLACEHOLDER_PREFIXES):
+        key = f"{name}\0{text}"
+    else:
+        key = text
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'little')
 
-# Initialize an empty list to store the dataframes
-dataframes = []
+def combine(source_files, output_path, chunk_rows=CHUNK_ROWS, rebuild=False):
+    """Append new or changed source CSVs to output_path, skipping documents already in it.
 
-# Loop through each CSV file
-for file in csv_files:
-    # Read the CSV file and only keep 'PDF Name' and 'Extracted Text' columns
-    df = pd.read_csv(file, usecols=['PDF Name', 'Extracted Text'])
-    
-    # Append the dataframe to the list
-    dataframes.append(df)
+    Sources are streamed chunk by chunk, so memory does not grow with the
+    corpus. A changed source has only its new documents appended; rows it no
+    longer contains stay in the output until a rebuild.
+    """
+    sources_path, hashes_path = sidecar_paths(output_path)
+    if rebuild:
+        for path in (output_path, sources_path, hashes_path):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+    store = corpus_store.is_store(output_path)
+    sources = source_manifest.load_entries(sources_path)
+    seen = HashSet(hashes_path)
+    new_sources = not os.path.exists(sources_path)
+    totals = {'appended': 0, 'duplicates': 0, 'skipped_sources': 0}
+    with open(sources_path, 'a', newline='', encoding='utf-8') as sources_file:
+        sources_writer = csv.DictWriter(sources_file, SOURCE_FIELDS)
+        if new_sources:
+            sources_writer.writeheader()
+        for source in sorted(source_files):
+            # The output and its sidecars may match the source glob too
+            if os.path.abspath(source) in map(os.path.abspath, (output_path, sources_path)):
+                continue
+            entry = sources.get(source)
+            state, stat, sha256 = source_manifest.check_file(source, entry)
+            if state == 'unchanged':
+                totals['skipped_sources'] += 1
+                continue
+            if state == 'touched':
+                totals['skipped_sources'] += 1
+                sources_writer.writerow({**entry, 'mtime_ns': stat.st_mtime_ns})
+                continue
 
-# Concatenate all the dataframes in the list into a single dataframe
-combined_df = pd.concat(dataframes, ignore_index=True)
+            writer = corpus_store.CorpusWriter(output_path, corpus_store.district_name(source)) if store else None
+            appended = 0
+            try:
+                chunks = pd.read_csv(source, usecols=COLUMNS, chunksize=chunk_rows)
+                for chunk in chunks:
+                    hashes = [document_hash(name, text) for name, text in zip(chunk['PDF Name'], chunk['Extracted Text'])]
+                    keep = []
+                    batch = set()
+                    for value in hashes:
+                        keep.append(value not in seen and value not in batch)
+                        batch.add(value)
+                    new_rows = chunk[keep]
+                    totals['duplicates'] += len(chunk) - len(new_rows)
+                    if len(new_rows):
+                        if writer:
+                            writer.write(new_rows)
+                        else:
+                            new_rows.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
+                        # Rows first, then their hashes: a crash in between can at worst append a document twice
+                        seen.add_many([value for value, k in zip(hashes, keep) if k])
+                        appended += len(new_rows)
+            except ValueError as e:
+                print(f"Skipping {source}: {e}")
+                continue
+            sources_writer.writerow({'path': source, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                     'sha256': sha256, 'rows': appended})
+            sources_file.flush()
+            totals['appended'] += appended
+            print(f"Added {appended} documents from {source}")
+    seen.close()
+    return totals
 
-# Save the combined dataframe to a new CSV file
-combined_df.to_csv(r"D:\HackRX\pdf-scraper\combined_dataset.csv", index=False)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combine the per-district CSVs into one dataset, incrementally.")
+    parser.add_argument('--sources', default=SOURCE_GLOB, help="glob of source CSVs")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="combined CSV, or a corpus store directory")
+    parser.add_argument('--rebuild', action='store_true', help="discard the output and combine every source again")
+    args = parser.parse_args()
 
-print("Combined dataset created and saved as 'combined_dataset.csv'")
+    totals = combine(glob.glob(args.sources), args.output, rebuild=args.rebuild)
+    print(f"Combined dataset saved to '{args.output}': {totals['appended']} documents added, "
+          f"{totals['duplicates']} duplicates skipped, {totals['skipped_sources']} sources already included")
@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# A corpus store is a directory of compressed Parquet part files partitioned by
+# district: <store>/district=<name>/part-<time>-<id>.parquet. A district filter
+# only opens that district's files, and since Parquet stores each column
+# separately, a projection to the feature columns never reads the text bytes.
+# Files starting with '_' or '.' (manifests, parts being written) are ignored.
+DISTRICT = 'district'
+COMPRESSION = 'zstd'
+ROWS_PER_PART = 256  # rows CorpusWriter buffers before writing a part file
+PARTITIONING = ds.partitioning(pa.schema([(DISTRICT, pa.string())]), flavor='hive')
+
+def is_store(path):
+    """Anything that isn't a .csv path is treated as a corpus store directory."""
+    return not str(path).lower().endswith('.csv')
+
+def district_name(path):
+    """District for a per-district CSV or folder: 'Ambala-pdf-data.csv' -> 'Ambala'."""
+    name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return name[:-len('-pdf-data')] if name.endswith('-pdf-data') else name
+
+def district_dir(path, district):
+    return os.path.join(path, f'{DISTRICT}={district}')
+
+def _table(frame):
+    """Arrow table for a frame; mixed-type object columns (e.g. int or "Unknown") are stored as text."""
+    arrays = []
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype == object:
+            values = [value if isinstance(value, str) else None if pd.isna(value) else str(value)
+                      for value in values]
+            arrays.append(pa.array(values, type=pa.string()))
+        else:
+            arrays.append(pa.array(values))
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in frame.columns])
+
+def write_frame(path, frame, district=None):
+    """Write frame as new part file(s), one per district; from its district column unless given."""
+    if district is None:
+        for name, group in frame.groupby(DISTRICT, sort=False):
+            write_frame(path, group, name)
+        return
+    directory = district_dir(path, district)
+    os.makedirs(directory, exist_ok=True)
+    part = f'part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet'
+    # Written under an ignored name and renamed, so readers never see half a file
+    tmp = os.path.join(directory, '.' + part)
+    pq.write_table(_table(frame.drop(columns=[DISTRICT], errors='ignore')), tmp, compression=COMPRESSION)
+    os.replace(tmp, os.path.join(directory, part))
+
+class CorpusWriter:
+    """Appends rows to one district of a store, a part file per ROWS_PER_PART rows."""
+
+    def __init__(self, path, district, overwrite=False, rows_per_part=ROWS_PER_PART):
+        self.path = path
+        self.district = district
+        self.directory = district_dir(path, district)
+        self.rows_per_part = rows_per_part
+        self._rows = []
+        if overwrite and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.parquet'):
+                    os.remove(os.path.join(self.directory, name))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, row):
+        self._rows.append(row)
+
+    def write(self, frame):
+        """Write a whole frame as a part file, after anything already appended."""
+        self.flush(force=True)
+        write_frame(self.path, frame, self.district)
+
+    def flush(self, force=False):
+        """Write buffered rows once there are rows_per_part of them (or any, with force).
+
+        Returns True when everything appended so far is on disk.
+        """
+        if self._rows and (force or len(self._rows) >= self.rows_per_part):
+            write_frame(self.path, pd.DataFrame(self._rows), self.district)
+            self._rows = []
+        return not self._rows
+
+    def close(self):
+        self.flush(force=True)
+
+def _filter(filters):
+    # Accepts a pyarrow expression or pandas-style DNF, e.g. [('district', 'in', ['Ambala'])]
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    return pq.filters_to_expression(filters)
+
+def dataset(path):
+    return ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+
+def schema_columns(path):
+    return dataset(path).schema.names
+
+def iter_frames(path, columns=None, filters=None, batch_size=None):
+    """Yield DataFrames of up to batch_size rows, reading only the given columns and matching rows.
+
+    Part files are read in name order, so rows come back in the order they were written
+    within each district.
+    """
+    store = dataset(path)
+    expression = _filter(filters)
+    fragments = sorted(store.get_fragments(filter=expression), key=lambda fragment: fragment.path)
+    for fragment in fragments:
+        scanner = ds.Scanner.from_fragment(fragment, schema=store.schema, columns=columns, filter=expression,
+                                           batch_size=batch_size or 131072)
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+def read(path, columns=None, filters=None):
+    frames = list(iter_frames(path, columns, filters))
+    if not frames:
+        return pd.DataFrame(columns=columns or schema_columns(path))
+    return pd.concat(frames, ignore_index=True)
+
+def fingerprint(path):
+    """sha256 over the store's part files (names and contents), for versioning derived artifacts."""
+    digest = hashlib.sha256()
+    for fragment in sorted(dataset(path).get_fragments(), key=lambda fragment: fragment.path):
+        digest.update(os.path.relpath(fragment.path, path).encode('utf-8'))
+        with open(fragment.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def replace(src, dst):
+    """os.replace that also swaps a store directory over an existing one."""
+    if os.path.isdir(dst):
+        old = dst + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(dst, old)
+        os.replace(src, dst)
+        shutil.rmtree(old)
+    else:
+        os.replace(src, dst)
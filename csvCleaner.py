@@ -1,35 +1,97 @@
-import csv
+import os
 import re
+import csv
+import glob
+import mmap
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_PATTERN = '*-pdf-data.csv'
+DEFAULT_OUTPUT_DIR = 'cleaned'
+# A lone '\r' ends a line for a file opened with newline='', so it must for the mmapped input too
+LONE_CR = re.compile(r'\r(?!\n)')
 
-def clean_text(text):
-    # Remove newlines and extra spaces
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+def iter_lines(path):
+    """Decoded lines of a memory-mapped file, split the way a newline='' text file splits them."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                text = line.decode('utf-8')
+                if LONE_CR.search(text):
+                    yield from (piece for piece in re.split(r'(?<=\r)(?!\n)', text) if piece)
+                else:
+                    yield text
 
 def process_csv(input_file, output_file):
-    with open(input_file, 'r', newline='', encoding='utf-8') as infile, \
-         open(output_file, 'w', newline='', encoding='utf-8') as outfile:
-        
-        reader = csv.reader(infile)
+    """Rejoin rows that were split across lines and write each as [PDF Name, cleaned text].
+
+    A row with two fields starts a record; any other row is a fragment of the
+    previous record's text. Each piece is whitespace-collapsed as it arrives
+    and kept in a list, so long records cost linear time. Returns a summary:
+    records written, records that needed repair and fragments merged.
+    """
+    stats = {'file': input_file, 'rows': 0, 'repaired': 0, 'fragments': 0}
+    with open(output_file, 'w', newline='', encoding='utf-8') as outfile:
         writer = csv.writer(outfile)
-        
+
         current_pdf = ""
-        current_text = ""
-        
-        for row in reader:
+        # Collapsed, non-empty pieces of the current record's text; joining
+        # them with single spaces collapses the raw concatenation's whitespace.
+        parts = []
+        repaired = False
+
+        def flush():
+            if current_pdf:
+                writer.writerow([current_pdf, ' '.join(parts)])
+                stats['rows'] += 1
+                stats['repaired'] += repaired
+
+        for row in csv.reader(iter_lines(input_file)):
             if len(row) == 2:
-                if current_pdf:
-                    writer.writerow([current_pdf, clean_text(current_text)])
+                flush()
                 current_pdf = row[0]
-                current_text = row[1]
+                parts = []
+                repaired = False
+                pieces = row[1:]
             else:
-                current_text += " " + " ".join(row)
-        
+                repaired = True
+                stats['fragments'] += 1
+                pieces = row
+            for piece in pieces:
+                piece = ' '.join(piece.split())
+                if piece:
+                    parts.append(piece)
+
         # Write the last row
-        if current_pdf:
-            writer.writerow([current_pdf, clean_text(current_text)])
+        flush()
+    return stats
+
+def clean_files(input_files, output_dir=DEFAULT_OUTPUT_DIR, workers=None):
+    """Run process_csv over several files in parallel, writing output_dir/<same name>."""
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = [os.path.join(output_dir, os.path.basename(path)) for path in input_files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(process_csv, input_files, outputs))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair rows split across lines in the scraped CSVs.")
+    parser.add_argument('inputs', nargs='*', help=f"CSV files (default: every {DEFAULT_PATTERN})")
+    parser.add_argument('--output', help="output file, when cleaning a single input")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="where cleaned copies of several inputs go")
+    parser.add_argument('--workers', type=int, help="processes (default: one per core)")
+    args = parser.parse_args()
 
-# Usage
-input_file = './pune-pdf-data.csv'
-output_file = 'output.csv'
-process_csv(input_file, output_file)
\ No newline at end of file
+    start = time.perf_counter()
+    if args.output:
+        if len(args.inputs) != 1:
+            parser.error("--output needs exactly one input")
+        results = [process_csv(args.inputs[0], args.output)]
+    else:
+        results = clean_files(sorted(args.inputs or glob.glob(DEFAULT_PATTERN)), args.output_dir, args.workers)
+    for stats in results:
+        print(f"{stats['file']}: {stats['rows']} rows, {stats['repaired']} repaired "
+              f"({stats['fragments']} fragments merged)")
+    print(f"Cleaned {len(results)} files in {time.perf_counter() - start:.2f}s")
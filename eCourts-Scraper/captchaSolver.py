@@ -1,6 +1,13 @@
+import os
+import sys
 import cv2
 import pytesseract
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ocr_cache import OcrCache
+
+ocr_results = OcrCache()
+
 def extract_text_from_image(image_path):
     # Read the image using OpenCV
     image = cv2.imread(image_path)
@@ -12,8 +19,8 @@ def extract_text_from_image(image_path):
     # You can use GaussianBlur, thresholding, etc. to improve text recognition
     gray_image = cv2.GaussianBlur(gray_image, (5, 5), 0)
 
-    # Extract text from image using Tesseract
-    text = pytesseract.image_to_string(gray_image)
+    # Extract text from image using Tesseract, keyed on the preprocessed image
+    text = ocr_results.cached(gray_image, 'tesseract', 'blur5', pytesseract.image_to_string)
 
     return text
 
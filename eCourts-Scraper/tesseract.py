@@ -1,17 +1,26 @@
+import os
+import sys
 import pytesseract
 from PIL import Image
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ocr_cache import OcrCache
+
 # Specify the path to the Tesseract executable
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'  # Change this to your Tesseract path
 
+TESSERACT_CONFIG = '--psm 6'  # You can adjust the config based on your needs
+ocr_results = OcrCache()
+
 def extract_text_from_image(image_path):
     """Extract text from an image using Tesseract OCR."""
     try:
         # Open the image file
         img = Image.open(image_path)
         
-        # Use Tesseract to do OCR on the image
-        extracted_text = pytesseract.image_to_string(img, config='--psm 6')  # You can adjust the config based on your needs
+        # Use Tesseract to do OCR on the image, unless this exact image was read before
+        extracted_text = ocr_results.cached(img, 'tesseract', TESSERACT_CONFIG,
+                                            lambda image: pytesseract.image_to_string(image, config=TESSERACT_CONFIG))
         
         return extracted_text.strip()  # Return the extracted text, stripped of extra whitespace
     except Exception as e:
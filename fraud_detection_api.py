@@ -1,73 +1,583 @@
-import io
-import pandas as pd
-import numpy as np
-from fastapi import FastAPI, File, UploadFile
+import os
+import copy
+import hashlib
+import sqlite3
+import zipfile
+import time
+import queue
+import threading
+import multiprocessing
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import List
+from concurrent.futures import Future, ProcessPoolExecutor
+import asyncio
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import torch
-from PyPDF2 import PdfReader
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler
+from pdf_extraction import extract_text_from_bytes
+from knn_index import DEFAULT_CSV, DEFAULT_INDEX_DIR, build_index, has_index, load_index, make_search
+import search_index
 import re
 import json
 
-app = FastAPI()
+class LazyComponent:
+    """A singleton that is loaded on first use, once, whichever thread asks first."""
 
-# Load Qwen 2.5 1.5B model and tokenizer
-model_name = "Qwen/Qwen2.5-1.5B-Instruct"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float16, low_cpu_mem_usage=True)
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.error = None
+
+    def get(self):
+        if self.load_seconds is None:
+            with self._lock:
+                if self.load_seconds is None:
+                    start = time.perf_counter()
+                    try:
+                        self._value = self._loader()
+                    except Exception as e:
+                        self.error = str(e)
+                        raise
+                    self.error = None
+                    self.load_seconds = time.perf_counter() - start
+        return self._value
+
+    @property
+    def ready(self):
+        return self.load_seconds is not None
+
+    def stats(self):
+        return {"ready": self.ready, "load_seconds": self.load_seconds, "error": self.error}
+
+# CPU thread pools per worker. Inter-op threads must be set before torch runs anything in parallel.
+INTRA_OP_THREADS = int(os.environ.get("FRAUD_INTRA_OP_THREADS", 0))
+INTER_OP_THREADS = int(os.environ.get("FRAUD_INTER_OP_THREADS", 0))
+if INTER_OP_THREADS:
+    torch.set_num_interop_threads(INTER_OP_THREADS)
+if INTRA_OP_THREADS:
+    torch.set_num_threads(INTRA_OP_THREADS)
+
+# Inference precision: fp16 (GPU only), fp32, bf16 or int8 (dynamic quantization
+# of the linear layers, CPU only). "auto" is fp16 on GPU and fp32 on CPU, where
+# fp16 matmuls are slow or silently upcast.
+PRECISIONS = ("fp16", "fp32", "bf16", "int8")
+PRECISION = os.environ.get("FRAUD_PRECISION", "auto")
+# Set FRAUD_PRECISION_BENCHMARK=1 to time every CPU precision at startup
+PRECISION_BENCHMARK = os.environ.get("FRAUD_PRECISION_BENCHMARK", "0") == "1"
 
 # Move model to GPU if available
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+if PRECISION == "auto":
+    PRECISION = "fp16" if device.type == "cuda" else "fp32"
+
+def load_model(precision):
+    """Load the classifier in the given precision and move it to device."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == "int8" and device.type != "cpu":
+        raise ValueError("int8 dynamic quantization only runs on CPU")
+    from transformers import AutoModelForCausalLM  # deferred: importing transformers takes seconds
+
+    dtype = {"fp16": torch.float16, "bf16": torch.bfloat16}.get(precision, torch.float32)
+    model = AutoModelForCausalLM.from_pretrained(MODEL_PATH or model_name, torch_dtype=dtype, low_cpu_mem_usage=True,
+                                                 **_local_snapshot_kwargs())
+    if precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.to(device)
+    model.eval()
+    return model
 
-# Load the existing classified data
-classified_data = pd.read_csv('combined_classified_qwen_detailed_optimized.csv')
+def benchmark_precisions(precisions=("fp32", "bf16", "int8"), new_tokens=32, repeats=2):
+    """Time greedy generation in each precision and compare its tokens with fp32.
 
-# Prepare the KNN model
-features = ['ClaimAmount', 'VehicleType', 'ClaimStatus', 'InsurerInvestigationOutcome', 'RelationshipToOwner']
+    token_agreement is the share of generated tokens equal to the fp32 run, a
+    cheap proxy for how much accuracy the faster modes give up.
+    """
+    tokenizer = tokenizer_component.get()
+    sample = tokenizer("Analyze the following text: MOTOR ACCIDENT CLAIMS TRIBUNAL. The claimant was "
+                       "hit by a truck and claims compensation of Rs. 5,00,000.", return_tensors="pt").to(device)
+    results = {}
+    reference = None
+    for precision in precisions:
+        candidate = load_model(precision)
+        with torch.no_grad():
+            candidate.generate(**sample, max_new_tokens=4, pad_token_id=tokenizer.pad_token_id)  # warm-up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                outputs = candidate.generate(**sample, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                                             do_sample=False, pad_token_id=tokenizer.pad_token_id)
+            elapsed = time.perf_counter() - start
+        generated = outputs[0, sample["input_ids"].shape[1]:].tolist()
+        if reference is None:
+            reference = generated
+        results[precision] = {
+            "tokens_per_sec": repeats * new_tokens / elapsed,
+            "token_agreement": sum(a == b for a, b in zip(generated, reference)) / len(reference),
+        }
+        print(f"{precision}: {results[precision]['tokens_per_sec']:.1f} tokens/sec, "
+              f"{results[precision]['token_agreement']:.0%} token agreement with {precisions[0]}")
+        del candidate
+    return results
 
-# Function to convert categorical variables to numerical
-def encode_categorical(df):
-    for column in df.columns:
-        if df[column].dtype == 'object':
-            df[column] = pd.Categorical(df[column]).codes
-    return df
+# Load Qwen 2.5 1.5B model and tokenizer. Set FRAUD_MODEL_PATH to a local
+# snapshot directory (e.g. from `huggingface-cli download`) to load without any
+# hub lookups; its safetensors weights are memory-mapped while loading.
+model_name = "Qwen/Qwen2.5-1.5B-Instruct"
+MODEL_PATH = os.environ.get("FRAUD_MODEL_PATH")
+
+def _local_snapshot_kwargs():
+    return {"local_files_only": True, "use_safetensors": True} if MODEL_PATH else {}
+
+def load_tokenizer():
+    from transformers import AutoTokenizer  # deferred: importing transformers takes seconds
+
+    return AutoTokenizer.from_pretrained(MODEL_PATH or model_name, local_files_only=bool(MODEL_PATH))
 
-# Prepare the existing data for KNN
-X = classified_data[features]
-X = encode_categorical(X)
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+precision_benchmark = None
 
-# Train the KNN model
+def load_classifier_model():
+    global precision_benchmark
+    if PRECISION_BENCHMARK and device.type == "cpu":
+        precision_benchmark = benchmark_precisions()
+    return load_model(PRECISION)
+
+# Load the prebuilt KNN index (see knn_index.py). The arrays are memory-mapped,
+# so every worker shares the same pages and startup does not grow with the dataset.
+KNN_INDEX_DIR = os.environ.get("FRAUD_KNN_INDEX_DIR", DEFAULT_INDEX_DIR)
+# Built from this classified CSV or corpus store when no index exists yet
+KNN_SOURCE = os.environ.get("FRAUD_KNN_SOURCE", DEFAULT_CSV)
+# Optional near_duplicates.py mapping; only canonical documents are then indexed
+KNN_DEDUP = os.environ.get("FRAUD_KNN_DEDUP")
+
+# Neighbour search over the mmapped matrix: 'exact' is brute force, 'ivf' is
+# approximate and only probes FRAUD_KNN_NPROBE lists (higher = better recall).
+KNN_BACKEND = os.environ.get("FRAUD_KNN_BACKEND", "exact")
+KNN_NPROBE = int(os.environ.get("FRAUD_KNN_NPROBE", 8))
+# IVF lists stored with an index built for the 'ivf' backend; 0 is about sqrt(rows)
+KNN_IVF_LISTS = int(os.environ.get("FRAUD_KNN_IVF_LISTS", 0))
 n_neighbors = 5  # You can adjust this
-knn = NearestNeighbors(n_neighbors=n_neighbors, metric='euclidean')
-knn.fit(X_scaled)
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+def load_knn():
+    if not has_index(KNN_INDEX_DIR):
+        build_index(KNN_SOURCE, KNN_INDEX_DIR, ivf_lists=KNN_IVF_LISTS if KNN_BACKEND == "ivf" else None,
+                    dedup_path=KNN_DEDUP)
+    knn_index = load_index(KNN_INDEX_DIR)
+    if KNN_BACKEND == "ivf" and knn_index.ivf is None:
+        # Training the lists here would run k-means in every worker
+        raise ValueError(f"KNN index {knn_index.path} has no IVF lists; rebuild it with "
+                         f"knn_index.py --ivf-lists or set FRAUD_KNN_BACKEND=exact")
+    return knn_index, make_search(knn_index, KNN_BACKEND, KNN_NPROBE)
 
-def classify_text(text):
-    labels = ['ClaimAmount', 'VehicleType', 'ClaimStatus', 'InsurerInvestigationOutcome', 'RelationshipToOwner']
-    prompt = f"""Analyze the following text and provide detailed classifications for these categories: {', '.join(labels)}. 
+# Full-text index of the scraped orders for /search (see search_index.py). It is
+# built offline, loaded on the first query and not needed for /ready; segments
+# added while the server runs are picked up on the next query.
+SEARCH_INDEX_DIR = os.environ.get("FRAUD_SEARCH_INDEX", search_index.DEFAULT_INDEX_DIR)
+MAX_SEARCH_RESULTS = int(os.environ.get("FRAUD_MAX_SEARCH_RESULTS", 100))
+
+def load_search():
+    return search_index.SearchIndex(SEARCH_INDEX_DIR)
+
+# Nothing heavy happens at import: each component loads on first use, or
+# during warm-up (see lifespan below), and /ready reports which are warm.
+tokenizer_component = LazyComponent("tokenizer", load_tokenizer)
+model_component = LazyComponent("model", load_classifier_model)
+knn_component = LazyComponent("knn", load_knn)
+search_component = LazyComponent("search", load_search)
+
+labels = ['ClaimAmount', 'VehicleType', 'ClaimStatus', 'InsurerInvestigationOutcome', 'RelationshipToOwner']
+
+# Micro-batching settings: wait up to MAX_WAIT_MS after the first pending prompt
+# for more prompts to arrive, and never run more than MAX_BATCH_SIZE at once.
+MAX_BATCH_SIZE = int(os.environ.get("FRAUD_MAX_BATCH_SIZE", 8))
+MAX_WAIT_MS = float(os.environ.get("FRAUD_MAX_WAIT_MS", 25))
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+class BatchingEngine:
+    """Collects pending prompts and runs them through one padded generate call."""
+
+    def __init__(self, generate_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, history=1000):
+        self.generate_fn = generate_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes = Counter()
+        self._wait_times = deque(maxlen=history)
+        self._generate_times = deque(maxlen=history)
+        self._thread = threading.Thread(target=self._run, name="qwen-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt):
+        """Queue a prompt (anything generate_fn accepts) and return a Future for its decoded response."""
+        future = Future()
+        self._queue.put((prompt, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop callers that gave up while waiting in the queue
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                responses = self.generate_fn([prompt for prompt, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            with self._lock:
+                self._requests += len(batch)
+                self._batches += 1
+                self._batch_sizes[len(batch)] += 1
+                self._wait_times.extend(started - queued_at for _, _, queued_at in batch)
+                self._generate_times.append(finished - started)
+
+            for (_, future, _), response in zip(batch, responses):
+                future.set_result(response)
+
+    def stats(self):
+        """Batch-size and wait-time metrics for tuning MAX_BATCH_SIZE / MAX_WAIT_MS."""
+        with self._lock:
+            waits = list(self._wait_times)
+            generate_times = list(self._generate_times)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_ms": {
+                    "p50": _percentile(waits, 50) * 1000,
+                    "p95": _percentile(waits, 95) * 1000,
+                    "max": max(waits, default=0.0) * 1000,
+                },
+                "generate_ms": {
+                    "p50": _percentile(generate_times, 50) * 1000,
+                    "p95": _percentile(generate_times, 95) * 1000,
+                },
+            }
+
+# The prompt is a fixed instruction prefix, the document tokens and a fixed
+# suffix. The prefix is encoded once when the prompt loads and its KV cache is
+# reused by every generate call, so only the document and suffix are prefilled
+# per request. Set FRAUD_PREFIX_CACHE=0 to prefill the whole prompt each time.
+PROMPT_PREFIX = f"""Analyze the following text and provide detailed classifications for these categories: {', '.join(labels)}. 
     For each category, provide the most specific and accurate information found in the text. If a category is not mentioned or cannot be determined from the text, state "Not specified" for that category.
     Provide the classification as a JSON object where keys are the categories and values are the detailed classifications.
-    Text: {text[:1500]}  # Truncate text to first 1500 characters to avoid token limit
+    Text:"""
+PROMPT_SUFFIX = """
     Detailed Classification:"""
-    
-    inputs = tokenizer.encode(prompt, return_tensors="pt").to(device)
-    
+# Document tokens kept in the prompt, measured with the model's tokenizer
+DOC_TOKEN_BUDGET = int(os.environ.get("FRAUD_DOC_TOKENS", 384))
+PREFIX_CACHE = os.environ.get("FRAUD_PREFIX_CACHE", "1") == "1"
+
+# Constrained decoding: the model may only emit {"ClaimAmount": "...", ...} with
+# the five keys in order and plain string values of at most MAX_VALUE_TOKENS
+# tokens, and it is forced to stop right after the closing brace. Set
+# FRAUD_CONSTRAINED_DECODING=0 to generate freely and regex out the JSON.
+CONSTRAINED_DECODING = os.environ.get("FRAUD_CONSTRAINED_DECODING", "1") == "1"
+MAX_VALUE_TOKENS = int(os.environ.get("FRAUD_MAX_VALUE_TOKENS", 24))
+# Generation limit when decoding freely; the constraint derives its own from the schema
+MAX_NEW_TOKENS = 200
+
+class JsonSchemaConstraint:
+    """Vocabulary tables for forcing the five-key classification JSON."""
+
+    def __init__(self, tokenizer, keys, vocab_size, max_value_tokens=MAX_VALUE_TOKENS):
+        self.eos_token_id = tokenizer.eos_token_id
+        self.max_value_tokens = max_value_tokens
+        # Fixed text around the values: {"K1": "<value>", "K2": "<value>", ... "}
+        self.literals = ['{"%s": "' % keys[0]] + ['", "%s": "' % key for key in keys[1:]] + ['"}']
+
+        special_ids = set(tokenizer.all_special_ids)
+        self.token_strings = tokenizer.batch_decode([[token_id] for token_id in range(len(tokenizer))],
+                                                    clean_up_tokenization_spaces=False)
+        self._ids_by_string = {}
+        value_ids = []
+        for token_id, string in enumerate(self.token_strings):
+            if token_id in special_ids or not string:
+                continue
+            self._ids_by_string.setdefault(string, []).append(token_id)
+            # Value tokens can't close or escape the JSON string; partial UTF-8 pieces decode to U+FFFD
+            if not any(c in '"\\\ufffd' or c < ' ' for c in string):
+                value_ids.append(token_id)
+        self.value_mask = torch.zeros(vocab_size, dtype=torch.bool)
+        self.value_mask[value_ids] = True
+        self._literal_ids = {}
+        # Longest possible output: every value runs to max_value_tokens, each closing
+        # literal is entered with its least useful prefix token, then EOS
+        self.max_new_tokens = (len(keys) * max_value_tokens + self._spelled_length(self.literals[0])
+                               + sum(max(1 + self._spelled_length(literal[end:]) for end in range(1, len(literal) + 1))
+                                     for literal in self.literals[1:])
+                               + 1)
+
+    def literal_ids(self, remaining):
+        """Tokens that spell a prefix of the remaining literal text."""
+        if remaining not in self._literal_ids:
+            ids = []
+            for end in range(1, len(remaining) + 1):
+                ids.extend(self._ids_by_string.get(remaining[:end], ()))
+            self._literal_ids[remaining] = ids
+        return self._literal_ids[remaining]
+
+    def _spelled_length(self, text):
+        """Tokens next_literal_id takes to spell text."""
+        count = 0
+        while text:
+            text = text[len(self.token_strings[self.next_literal_id(text)]):]
+            count += 1
+        return count
+
+    def next_literal_id(self, remaining):
+        """The longest token that spells a prefix of the remaining literal text."""
+        for end in range(len(remaining), 0, -1):
+            ids = self._ids_by_string.get(remaining[:end])
+            if ids:
+                return ids[0]
+        raise ValueError(f"No token spells a prefix of {remaining!r}")
+
+class JsonSchemaLogitsProcessor:
+    """Per-generate state machine that masks every token the schema does not allow next.
+
+    Each row is in ("literal", i, chars matched), ("value", i, tokens emitted)
+    or ("done", i, 0); value i sits between literals i and i + 1.
+    """
+
+    def __init__(self, constraint):
+        self.constraint = constraint
+        self.states = None
+
+    def _advance(self, state, token_id):
+        kind, index, progress = state
+        if kind == "done":
+            return state
+        literals = self.constraint.literals
+        string = self.constraint.token_strings[token_id]
+        if kind == "value":
+            if '"' not in string:
+                return ("value", index, progress + 1)
+            # The token opens the literal that closes this value
+            index, progress = index + 1, 0
+        progress += len(string)
+        if progress < len(literals[index]):
+            return ("literal", index, progress)
+        if index == len(literals) - 1:
+            return ("done", index, 0)
+        return ("value", index, 0)
+
+    def __call__(self, input_ids, scores):
+        if self.states is None:
+            self.states = [("literal", 0, 0)] * input_ids.shape[0]
+        else:
+            self.states = [self._advance(state, token_id) for state, token_id in zip(self.states, input_ids[:, -1].tolist())]
+
+        constraint = self.constraint
+        allowed = torch.zeros_like(scores, dtype=torch.bool)
+        for row, (kind, index, progress) in enumerate(self.states):
+            if kind == "done":
+                allowed[row, constraint.eos_token_id] = True
+            elif kind == "value":
+                # Keep writing the value, or close it with any token that starts the next literal
+                if progress < constraint.max_value_tokens:
+                    allowed[row] = constraint.value_mask
+                allowed[row, constraint.literal_ids(constraint.literals[index + 1])] = True
+            else:
+                # Nothing to decide inside a literal, so spell it with as few tokens as possible
+                allowed[row, constraint.next_literal_id(constraint.literals[index][progress:])] = True
+        return scores.masked_fill(~allowed, float("-inf"))
+
+class PromptTemplate:
+    """Token ids, prefix KV cache and decoding constraint for the classification prompt."""
+
+    def __init__(self, tokenizer, model):
+        self.tokenizer = tokenizer
+        self.prefix_ids = tokenizer(PROMPT_PREFIX).input_ids
+        self.suffix_ids = tokenizer(PROMPT_SUFFIX, add_special_tokens=False).input_ids
+        self.prefix_cache = None
+        if PREFIX_CACHE:
+            with torch.no_grad():
+                self.prefix_cache = model(torch.tensor([self.prefix_ids], device=device), use_cache=True).past_key_values
+        self.json_constraint = None
+        if CONSTRAINED_DECODING:
+            self.json_constraint = JsonSchemaConstraint(tokenizer, labels, model.config.vocab_size)
+
+    def encode_documents(self, texts):
+        """Token ids for the per-request part of each prompt: the document cut to DOC_TOKEN_BUDGET tokens, then the suffix."""
+        encoded = self.tokenizer([" " + text for text in texts], add_special_tokens=False).input_ids
+        return [doc_ids[:DOC_TOKEN_BUDGET] + self.suffix_ids for doc_ids in encoded]
+
+prompt_component = LazyComponent("prompt", lambda: PromptTemplate(tokenizer_component.get(), model_component.get()))
+
+def generate_batch(texts):
+    """Run one generate call over the shared prefix plus each document's token ids."""
+    from transformers import LogitsProcessorList
+
+    tokenizer = tokenizer_component.get()
+    model = model_component.get()
+    template = prompt_component.get()
+    documents = template.encode_documents(texts)
+
+    batch_size = len(documents)
+    prefix_len = len(template.prefix_ids)
+    doc_len = max(len(ids) for ids in documents)
+
+    # Pad between the prefix and each document rather than on the left, so the
+    # prefix sits at the same positions in every row and matches the prefix cache
+    input_ids = torch.full((batch_size, prefix_len + doc_len), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros_like(input_ids)
+    input_ids[:, :prefix_len] = torch.tensor(template.prefix_ids)
+    attention_mask[:, :prefix_len] = 1
+    for row, ids in enumerate(documents):
+        input_ids[row, prefix_len + doc_len - len(ids):] = torch.tensor(ids)
+        attention_mask[row, prefix_len + doc_len - len(ids):] = 1
+
+    past_key_values = None
+    if template.prefix_cache is not None:
+        past_key_values = copy.deepcopy(template.prefix_cache)
+        past_key_values.batch_repeat_interleave(batch_size)
+
+    logits_processor = None
+    max_new_tokens = MAX_NEW_TOKENS
+    if template.json_constraint is not None:
+        logits_processor = LogitsProcessorList([JsonSchemaLogitsProcessor(template.json_constraint)])
+        max_new_tokens = template.json_constraint.max_new_tokens
+
     with torch.no_grad():
-        outputs = model.generate(inputs, max_new_tokens=200, num_return_sequences=1, temperature=0.2)
-    
-    response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    
+        outputs = model.generate(input_ids=input_ids.to(device), attention_mask=attention_mask.to(device),
+                                 past_key_values=past_key_values, logits_processor=logits_processor,
+                                 max_new_tokens=max_new_tokens, num_return_sequences=1, temperature=0.2,
+                                 pad_token_id=tokenizer.pad_token_id)
+
+    generated = outputs[:, input_ids.shape[1]:]
+    return tokenizer.batch_decode(generated, skip_special_tokens=True)
+
+batcher = BatchingEngine(generate_batch)
+
+# Result caches: raw PDF hash -> extracted text, and prompt text hash ->
+# classification dict. Both are in-memory LRUs; set FRAUD_CACHE_DB to a file
+# path to back them with SQLite so entries survive restarts.
+CACHE_SIZE = int(os.environ.get("FRAUD_CACHE_SIZE", 1024))
+CACHE_DB = os.environ.get("FRAUD_CACHE_DB")
+# Characters kept before tokenizing; generous enough that DOC_TOKEN_BUDGET is what binds
+PROMPT_CHARS = 8 * DOC_TOKEN_BUDGET
+
+class ResultCache:
+    """LRU cache keyed by content hash with an optional SQLite backing store."""
+
+    def __init__(self, name, max_entries=CACHE_SIZE, db_path=CACHE_DB):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db.commit()
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key, count=True):
+        """Cached value or None; count=False leaves the hit/miss counters alone for a repeat lookup."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += count
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            if self._db is not None:
+                row = self._db.execute(f"SELECT value FROM {self.name} WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += count
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    return value
+            self.misses += count
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(f"INSERT OR REPLACE INTO {self.name} (key, value) VALUES (?, ?)",
+                                 (key, json.dumps(value)))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+text_cache = ResultCache("pdf_text")
+classification_cache = ResultCache("classification")
+
+def pdf_cache_key(pdf_content):
+    # Cached text is cut at PROMPT_CHARS, so a larger FRAUD_DOC_TOKENS must not reuse shorter entries
+    digest = hashlib.sha256(pdf_content)
+    digest.update(f"\0{PROMPT_CHARS}".encode("ascii"))
+    return digest.hexdigest()
+
+def prompt_text(text):
+    """Whitespace-normalised document text, cut to PROMPT_CHARS before tokenizing."""
+    return re.sub(r'\s+', ' ', text).strip()[:PROMPT_CHARS]
+
+# Everything besides the text that changes what the model answers; FRAUD_CACHE_DB
+# outlives restarts, so a different snapshot or decoding mode must not reuse entries
+CLASSIFICATION_CONFIG = (f"{model_name}\0{MODEL_PATH}\0{PRECISION}\0{DOC_TOKEN_BUDGET}\0"
+                         f"{CONSTRAINED_DECODING}\0{MAX_VALUE_TOKENS}")
+
+def classification_cache_key(text):
+    return hashlib.sha256(f"{CLASSIFICATION_CONFIG}\0{prompt_text(text)}".encode("utf-8")).hexdigest()
+
+def parse_classification(response):
     try:
         json_str = re.search(r'\{.*\}', response, re.DOTALL).group()
         classification_dict = json.loads(json_str)
@@ -76,51 +586,303 @@ def classify_text(text):
         print(f"Error parsing response: {response}")
         return {label: "Error in classification" for label in labels}
 
-def detect_fraud(new_case):
-    # Prepare the new case data
-    new_case_df = pd.DataFrame([new_case])
-    new_case_encoded = encode_categorical(new_case_df)
-    new_case_scaled = scaler.transform(new_case_encoded)
-    
+def _cache_classification(key, classification):
+    # Parse failures are worth retrying, so only successful classifications are cached
+    if "Error in classification" not in classification.values():
+        classification_cache.put(key, classification)
+    return classification
+
+def classify_text(text):
+    key = classification_cache_key(text)
+    cached = classification_cache.get(key)
+    if cached is not None:
+        return cached
+    response = batcher.submit(prompt_text(text)).result()
+    return _cache_classification(key, parse_classification(response))
+
+async def classify_text_async(text, counted=False):
+    """Awaitable classify_text that waits on the batcher without blocking the event loop.
+
+    counted=True means the caller already looked this text up (and missed), so
+    the check here, which catches a concurrent request that has since filled
+    the cache, doesn't count as a second lookup.
+    """
+    key = classification_cache_key(text)
+    cached = classification_cache.get(key, count=not counted)
+    if cached is not None:
+        return cached
+    response = await asyncio.wrap_future(batcher.submit(prompt_text(text)))
+    return _cache_classification(key, parse_classification(response))
+
+# You can adjust this threshold based on your needs
+fraud_threshold = 0.7
+
+def detect_fraud_many(new_cases):
+    """Score a batch of classification dicts against the KNN index in one query."""
+    knn_index, knn = knn_component.get()
+
+    # Encode with the index's frozen vocabularies straight into a float32 array
+    new_cases_scaled = knn_index.encode(new_cases)
+
     # Find the nearest neighbors
-    distances, indices = knn.kneighbors(new_case_scaled)
-    
+    distances, indices = knn.kneighbors(new_cases_scaled, n_neighbors)
+
     # Calculate the average fraud score of the neighbors
-    neighbor_fraud_scores = classified_data.iloc[indices[0]]['FraudRiskScore']
-    avg_fraud_score = neighbor_fraud_scores.mean()
-    
-    # You can adjust this threshold based on your needs
-    fraud_threshold = 0.7
-    
-    is_fraudulent = avg_fraud_score > fraud_threshold
-    
-    return {
-        "is_fraudulent": bool(is_fraudulent),
-        "fraud_score": float(avg_fraud_score),
-        "nearest_neighbors": indices[0].tolist()
-    }
+    avg_fraud_scores = knn_index.fraud_scores[indices].mean(axis=1)
+
+    return [
+        {
+            "is_fraudulent": bool(avg_fraud_score > fraud_threshold),
+            "fraud_score": float(avg_fraud_score),
+            "nearest_neighbors": neighbor_indices.tolist()
+        }
+        for avg_fraud_score, neighbor_indices in zip(avg_fraud_scores, indices)
+    ]
+
+def detect_fraud(new_case):
+    return detect_fraud_many([new_case])[0]
 
 class FraudDetectionResponse(BaseModel):
     classification: dict
     fraud_analysis: dict
 
+# Request pipeline: PDF extraction runs in a bounded process pool, generation
+# goes through the batcher thread and KNN scoring runs inline. At most
+# MAX_IN_FLIGHT requests are admitted; the rest wait up to QUEUE_TIMEOUT_S for
+# a slot and are then rejected with 429. Workers come from a forkserver so they
+# don't inherit a fork of this process with torch, the model and the batcher
+# thread already loaded. A forkserver or spawn worker does re-run the __main__
+# script, so serve the app with `uvicorn fraud_detection_api:app` rather than
+# running this file, or every worker would import torch again.
+EXTRACTION_WORKERS = int(os.environ.get("FRAUD_EXTRACTION_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+MAX_IN_FLIGHT = int(os.environ.get("FRAUD_MAX_IN_FLIGHT", 32))
+QUEUE_TIMEOUT_S = float(os.environ.get("FRAUD_QUEUE_TIMEOUT_S", 5))
+
+# Windows has no forkserver; spawn gives the same clean workers there.
+EXTRACTION_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+extraction_context = multiprocessing.get_context(EXTRACTION_START_METHOD)
+if EXTRACTION_START_METHOD == "forkserver":
+    extraction_context.set_forkserver_preload(["pdf_extraction"])
+extraction_pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=extraction_context)
+
+class AdmissionControl:
+    """Caps the number of requests in the pipeline and counts rejections."""
+
+    def __init__(self, max_in_flight, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, timeout):
+        """Hold one pipeline slot; timeout=None waits for a slot instead of rejecting."""
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Fraud detection pipeline is at capacity, retry later",
+                                headers={"Retry-After": str(max(1, int(self.queue_timeout)))})
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+admission = AdmissionControl(MAX_IN_FLIGHT, QUEUE_TIMEOUT_S)
+
+# Warm-up at startup: "background" (default) starts loading every component and
+# pushes one document through the model while the worker already serves
+# /health and /ready, "blocking" finishes that before the worker accepts
+# requests, and "off" leaves everything to load on first use.
+WARMUP = os.environ.get("FRAUD_WARMUP", "background")
+WARMUP_TEXT = "MOTOR ACCIDENT CLAIMS TRIBUNAL. The claimant was hit by a truck and claims Rs. 5,00,000."
+
+components = [tokenizer_component, model_component, prompt_component, knn_component]
+warmup_status = {"mode": WARMUP, "state": "pending", "seconds": None, "error": None}
+
+def warm_up():
+    """Load every component and run one request through the batcher and KNN index."""
+    warmup_status["state"] = "running"
+    start = time.perf_counter()
+    try:
+        knn_component.get()
+        batcher.submit(prompt_text(WARMUP_TEXT)).result()
+        detect_fraud({label: "Unknown" for label in labels})
+    except Exception as e:
+        warmup_status.update(state="failed", error=str(e))
+        print(f"Warm-up failed: {e}")
+        return
+    warmup_status.update(state="done", seconds=time.perf_counter() - start)
+
+@asynccontextmanager
+async def lifespan(app):
+    loop = asyncio.get_running_loop()
+    if WARMUP == "blocking":
+        await loop.run_in_executor(None, warm_up)
+    elif WARMUP == "background":
+        loop.run_in_executor(None, warm_up)
+    yield
+    extraction_pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
+
+async def analyze_pdf(pdf_content, timeout=QUEUE_TIMEOUT_S):
+    """Run one PDF through extraction, classification and fraud scoring."""
+    # Re-uploaded orders are answered from the caches without entering the pipeline
+    pdf_hash = pdf_cache_key(pdf_content)
+    text = text_cache.get(pdf_hash)
+    looked_up = text is not None
+    classification = classification_cache.get(classification_cache_key(text)) if looked_up else None
+
+    if classification is None:
+        async with admission.slot(timeout):
+            # Extract text from the PDF in the extraction pool
+            if text is None:
+                loop = asyncio.get_running_loop()
+                # The prompt only uses the first PROMPT_CHARS characters, so stop extracting once they are there
+                text = await loop.run_in_executor(extraction_pool, extract_text_from_bytes, pdf_content, PROMPT_CHARS)
+                text_cache.put(pdf_hash, text)
+
+            # Classify the text (batched with other in-flight requests)
+            classification = await classify_text_async(text, counted=looked_up)
+
+    # Loading the KNN index (or building it) takes seconds, so the first request
+    # waits for it in a thread rather than on the event loop, as /search does
+    if not knn_component.ready:
+        await asyncio.get_running_loop().run_in_executor(None, knn_component.get)
+
+    # Detect fraud; a single KNN query is cheap enough to run inline
+    fraud_analysis = detect_fraud(classification)
+    return classification, fraud_analysis
+
 @app.post("/detect_fraud", response_model=FraudDetectionResponse)
 async def detect_fraud_endpoint(file: UploadFile = File(...)):
-    # Read and extract text from the PDF
-    pdf_content = await file.read()
-    text = extract_text_from_pdf(io.BytesIO(pdf_content))
-    
-    # Classify the text
-    classification = classify_text(text)
-    
-    # Detect fraud
-    fraud_analysis = detect_fraud(classification)
-    
+    classification, fraud_analysis = await analyze_pdf(await file.read())
+
     return FraudDetectionResponse(
         classification=classification,
         fraud_analysis=fraud_analysis
     )
 
+# Documents of one batch request that may be in the pipeline at the same time.
+# Batch documents wait for a pipeline slot instead of being rejected with 429.
+BATCH_CONCURRENCY = int(os.environ.get("FRAUD_BATCH_CONCURRENCY", 2 * MAX_BATCH_SIZE))
+# ZIP members are decompressed whole, so larger ones are reported as errors instead
+MAX_ZIP_MEMBER_BYTES = int(os.environ.get("FRAUD_MAX_ZIP_MEMBER_MB", 50)) * 1024 * 1024
+
+def _is_zip(upload):
+    return (upload.filename or "").lower().endswith(".zip") or upload.content_type in ("application/zip", "application/x-zip-compressed")
+
+def _read_member(archive, member):
+    if member.file_size > MAX_ZIP_MEMBER_BYTES:
+        raise ValueError(f"ZIP member is {member.file_size} bytes uncompressed, "
+                         f"over the {MAX_ZIP_MEMBER_BYTES} byte limit")
+    # ZipExtFile stops reading at file_size, so a header that understates the size fails its CRC check instead
+    return archive.read(member)
+
+def _batch_documents(uploads):
+    """Yield (name, read) pairs for every PDF in the uploads, expanding ZIP archives lazily.
+
+    Opening an archive parses its central directory, so call this off the event loop.
+    """
+    for upload in uploads:
+        if not _is_zip(upload):
+            yield upload.filename, upload.read
+            continue
+        archive = zipfile.ZipFile(upload.file)
+        for member in archive.infolist():
+            if not member.is_dir() and member.filename.lower().endswith(".pdf"):
+                async def read(archive=archive, member=member):
+                    return await asyncio.get_running_loop().run_in_executor(None, _read_member, archive, member)
+                yield member.filename, read
+
+@app.post("/detect_fraud/batch")
+async def detect_fraud_batch_endpoint(files: List[UploadFile] = File(...)):
+    """Analyze many PDFs (or ZIP archives of PDFs) and stream one JSON line per document as it finishes."""
+    try:
+        documents = await asyncio.get_running_loop().run_in_executor(None, lambda: list(_batch_documents(files)))
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ZIP archive: {e}")
+
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(index, name, read):
+        async with limit:
+            try:
+                classification, fraud_analysis = await analyze_pdf(await read(), timeout=None)
+                return {"index": index, "name": name, "classification": classification, "fraud_analysis": fraud_analysis}
+            except Exception as e:
+                return {"index": index, "name": name, "error": str(e)}
+
+    async def results():
+        tasks = [asyncio.create_task(run(index, name, read)) for index, (name, read) in enumerate(documents)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # The client went away: drop the documents that have not finished
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.get("/search")
+def search(q: str, limit: int = Query(10, ge=1), district: List[str] = Query(None)):
+    """Orders containing every term of q (words, Rs. amounts, sections, case and vehicle numbers), best first."""
+    # A plain def, so FastAPI runs it in its threadpool: loading the index on
+    # the first query, and new segments later, never blocks the event loop
+    try:
+        index = search_component.get()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    hits, total = index.search(q, min(limit, MAX_SEARCH_RESULTS), district)
+    return {"query": q, "total": total, "results": hits}
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Which components are warm; 503 until the model and KNN index can serve requests."""
+    body = {
+        "ready": all(component.ready for component in components),
+        "components": {component.name: component.stats() for component in components},
+        "warmup": warmup_status,
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "batching": batcher.stats(),
+        "pipeline": admission.stats(),
+        "cache": {"pdf_text": text_cache.stats(), "classification": classification_cache.stats()},
+        "search": {**search_component.stats(), **(search_component.get().stats() if search_component.ready else {})},
+        "inference": {
+            "precision": PRECISION,
+            "device": str(device),
+            "intra_op_threads": torch.get_num_threads(),
+            "inter_op_threads": torch.get_num_interop_threads(),
+            "precision_benchmark": precision_benchmark,
+        },
+    }
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # See the extraction pool above: as __main__, this module would be re-imported by every worker
+    raise SystemExit("Serve the API with: uvicorn fraud_detection_api:app --host 0.0.0.0 --port 8000")
\ No newline at end of file
@@ -1,18 +1,40 @@
 import os
 import csv
+from concurrent.futures import ThreadPoolExecutor
 import easyocr
-from pdf2image import convert_from_path
-import PyPDF2
-from PIL import Image
-import io
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+import pdf_extraction
+import corpus_store
+from ocr_cache import OcrCache
 
 # Initialize EasyOCR reader
 reader = easyocr.Reader(['en'])  # For English. Add more languages if needed.
 
+# Cached OCR results are only reused for the same engine version and languages
+OCR_ENGINE = f"easyocr-{easyocr.__version__}"
+OCR_CONFIG = "en"
+ocr_results = OcrCache()
+
 POPPLER_PATH = r"C:\Users\hp\Downloads\Release-24.08.0-0\poppler-24.08.0\Library\bin"  # Change this to your Poppler path
 
-def extract_text_from_image(image):
-    """Extract text from an image using EasyOCR."""
+# Pages sent through EasyOCR per readtext_batched call; detection runs on the
+# whole batch at once, so this also bounds its memory use.
+OCR_BATCH_SIZE = 8
+
+# Scanned pages are rendered a window at a time so memory stays bounded no
+# matter how long the document is; the next window renders while the current
+# one is being OCRed. A window takes the next RENDER_WINDOW text-less pages
+# wherever they are, so OCR batches stay full when scanned and digital pages
+# alternate.
+RENDER_DPI = 200
+RENDER_GRAYSCALE = True
+RENDER_WINDOW = OCR_BATCH_SIZE
+# Pages with text between two scanned ones are rendered (and dropped) rather
+# than starting another pdftoppm run, up to this many in a row.
+MAX_RENDER_GAP = 1
+
+def ocr_image(image):
     try:
         results = reader.readtext(image)
         return ' '.join([result[1] for result in results])
@@ -20,51 +42,142 @@ def extract_text_from_image(image):
         print(f"Error extracting text from image: {e}")
         return None
 
+def extract_text_from_image(image):
+    """Extract text from an image using EasyOCR, reusing cached results."""
+    return ocr_results.cached(image, OCR_ENGINE, OCR_CONFIG, ocr_image)
+
+def extract_text_from_images(images):
+    """Extract text from a list of page images (numpy arrays) using batched EasyOCR."""
+    keys = [OcrCache.key(image, OCR_ENGINE, OCR_CONFIG) for image in images]
+    texts = [ocr_results.get(key) for key in keys]
+    # readtext_batched needs equally sized images, so batch uncached pages of the same shape together
+    by_shape = {}
+    for i, image in enumerate(images):
+        if texts[i] is None:
+            by_shape.setdefault(image.shape, []).append(i)
+    for indices in by_shape.values():
+        for start in range(0, len(indices), OCR_BATCH_SIZE):
+            batch = indices[start:start + OCR_BATCH_SIZE]
+            try:
+                results = reader.readtext_batched([images[i] for i in batch], batch_size=OCR_BATCH_SIZE)
+            except Exception as e:
+                print(f"Error extracting text from images: {e}")
+                continue
+            for i, page_results in zip(batch, results):
+                texts[i] = ' '.join([result[1] for result in page_results])
+                ocr_results.put(keys[i], texts[i])
+    return texts
+
+def page_runs(page_indices, max_gap=0):
+    """Group sorted 0-based page indices into (first, last) runs, bridging gaps of up to max_gap pages."""
+    runs = []
+    for index in page_indices:
+        if runs and index - runs[-1][1] - 1 <= max_gap:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+def render_pages(pdf_path, first, last):
+    """Rasterize 0-based pages first..last (inclusive) to numpy arrays."""
+    pages = convert_from_path(pdf_path, dpi=RENDER_DPI, grayscale=RENDER_GRAYSCALE,
+                              first_page=first + 1, last_page=last + 1, poppler_path=POPPLER_PATH)
+    # EasyOCR takes arrays directly, no need to re-encode each page as PNG
+    return [np.asarray(page) for page in pages]
+
+def render_window(pdf_path, page_indices):
+    """Images of the given sorted 0-based pages, one pdftoppm run per run of nearby pages."""
+    wanted = set(page_indices)
+    images = []
+    for first, last in page_runs(page_indices, MAX_RENDER_GAP):
+        pages = render_pages(pdf_path, first, last)
+        images.extend(image for index, image in zip(range(first, last + 1), pages) if index in wanted)
+    return images
+
+def iter_page_windows(pdf_path, page_indices):
+    """Yield (page indices, images) windows of up to RENDER_WINDOW pages, contiguous or not.
+
+    Rendering of the following window runs in the background while the
+    caller works on the current one. As long as the caller drops each
+    window's images before asking for the next, as process_pdf does, at most
+    two windows are held at once.
+    """
+    windows = [page_indices[start:start + RENDER_WINDOW] for start in range(0, len(page_indices), RENDER_WINDOW)]
+    if not windows:
+        return
+    with ThreadPoolExecutor(max_workers=1) as renderer:
+        pending = renderer.submit(render_window, pdf_path, windows[0])
+        for k, indices in enumerate(windows):
+            images = pending.result()
+            if k + 1 < len(windows):
+                pending = renderer.submit(render_window, pdf_path, windows[k + 1])
+            yield indices, images
+            del images
+
 def process_pdf(pdf_path):
-    """Process a PDF file and extract text from each page."""
+    """Process a PDF file and extract text from each page.
+
+    Pages with a text layer are read with PyPDF2; only pages without one are
+    rasterized and OCRed, streamed in windows of RENDER_WINDOW pages.
+    """
     try:
         # First, try to extract text directly using PyPDF2
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n\n"
-            if text.strip():
-                return text.strip()
+            page_texts = list(pdf_extraction.iter_page_text(pdf_path, pdf_extraction.PAGE_WORKERS))
         except Exception as e:
             print(f"PyPDF2 failed: {e}. Trying OCR...")
+            page_texts = [""] * pdfinfo_from_path(pdf_path, poppler_path=POPPLER_PATH)["Pages"]
+
+        # Use OCR for the pages PyPDF2 found no text on
+        missing = [i for i, page_text in enumerate(page_texts) if not page_text.strip()]
+        for indices, images in iter_page_windows(pdf_path, missing):
+            for i, page_text in zip(indices, extract_text_from_images(images)):
+                if page_text:
+                    page_texts[i] = f"Page {i+1}: {page_text}"
+            del images
 
-        # If PyPDF2 fails or extracts no text, use OCR
-        images = convert_from_path(pdf_path, poppler_path=POPPLER_PATH)
-        text = ""
-        for i, image in enumerate(images):
-            # Convert PIL Image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-
-            page_text = extract_text_from_image(img_byte_arr)
-            if page_text:
-                text += f"Page {i+1}: {page_text}\n\n"
-        
+        text = "\n\n".join(page_text for page_text in page_texts if page_text.strip())
         return text.strip() if text.strip() else "No text could be extracted from this PDF."
     except Exception as e:
         print(f"Error processing PDF {pdf_path}: {e}")
         return f"Failed to process due to error: {str(e)}"
 
-def process_folder(folder_path, output_csv):
-    """Process all PDFs in a folder and save results to a CSV file."""
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
+def process_folder(folder_path, output_csv, district=None):
+    """Process all PDFs in a folder and save results to a CSV file.
+
+    output_csv may instead be a corpus store directory; the folder's rows then
+    replace its district partition (named after the folder unless given).
+    """
+    if corpus_store.is_store(output_csv):
+        writer = corpus_store.CorpusWriter(output_csv, district or corpus_store.district_name(folder_path),
+                                           overwrite=True)
+        write_row = lambda filename, text: writer.append({'PDF Name': filename, 'Extracted Text': text})
+        csvfile = None
+    else:
+        writer = None
+        csvfile = open(output_csv, 'w', newline='', encoding='utf-8')
         csv_writer = csv.writer(csvfile)
         csv_writer.writerow(['PDF Name', 'Extracted Text'])
-        
+        write_row = lambda filename, text: csv_writer.writerow([filename, text])
+
+    try:
         for filename in os.listdir(folder_path):
             if filename.lower().endswith('.pdf'):
                 pdf_path = os.path.join(folder_path, filename)
                 extracted_text = process_pdf(pdf_path)
-                csv_writer.writerow([filename, extracted_text])
+                write_row(filename, extracted_text)
+                if writer:
+                    writer.flush()
                 print(f"Processed: {filename}")
+    finally:
+        if writer:
+            writer.close()
+        else:
+            csvfile.close()
+
+    stats = ocr_results.stats()
+    print(f"OCR cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%}), {stats['entries']} entries, {stats['bytes']} bytes")
 
 if __name__ == "__main__":
     pdf_folder = r'C:\Users\hp\Downloads\Aurangabad'  # Your PDF folder path
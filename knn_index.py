@@ -0,0 +1,398 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import corpus_store
+import source_manifest
+
+# Bump when the on-disk layout changes; load_index refuses other versions
+INDEX_FORMAT_VERSION = 1
+
+DEFAULT_CSV = 'combined_classified_qwen_detailed_optimized.csv'
+DEFAULT_INDEX_DIR = 'knn_index'
+FEATURES = ['ClaimAmount', 'VehicleType', 'ClaimStatus', 'InsurerInvestigationOutcome', 'RelationshipToOwner']
+
+# What to do with a category the training data never saw: 'fallback' maps it to
+# FALLBACK_CATEGORY when that is in the vocabulary (the classifiers emit
+# "Unknown"), 'bucket' always gives it a dedicated code one past the vocabulary.
+UNKNOWN_POLICIES = ('fallback', 'bucket')
+FALLBACK_CATEGORY = 'Unknown'
+
+class CategoricalEncoder:
+    """Frozen per-feature vocabularies that encode classification dicts consistently with training."""
+
+    def __init__(self, features, vocabularies, numeric_defaults=None, unknown_policy='fallback'):
+        if unknown_policy not in UNKNOWN_POLICIES:
+            raise ValueError(f"unknown_policy must be one of {UNKNOWN_POLICIES}, got {unknown_policy!r}")
+        self.features = list(features)
+        self.vocabularies = vocabularies
+        self.numeric_defaults = numeric_defaults or {}
+        self.unknown_policy = unknown_policy
+        self._lookups = []
+        self._unknown_codes = []
+        for feature in self.features:
+            vocabulary = vocabularies.get(feature)
+            if vocabulary is None:
+                self._lookups.append(None)
+                self._unknown_codes.append(float(self.numeric_defaults.get(feature, 0.0)))
+                continue
+            lookup = {str(category): float(code) for code, category in enumerate(vocabulary)}
+            if unknown_policy == 'fallback' and FALLBACK_CATEGORY in lookup:
+                unknown_code = lookup[FALLBACK_CATEGORY]
+            else:
+                unknown_code = float(len(vocabulary))
+            self._lookups.append(lookup)
+            self._unknown_codes.append(unknown_code)
+
+    @classmethod
+    def fit(cls, frame, features, unknown_policy='fallback'):
+        """Freeze the sorted category set of every non-numeric feature column."""
+        vocabularies = {}
+        for feature in features:
+            if not pd.api.types.is_numeric_dtype(frame[feature]):
+                vocabularies[feature] = pd.Categorical(frame[feature]).categories.tolist()
+        return cls(features, vocabularies, unknown_policy=unknown_policy)
+
+    def encode_frame(self, frame):
+        """Vectorised encoding of a training frame; missing values get code -1 like pd.Categorical."""
+        columns = []
+        for feature in self.features:
+            column = frame[feature]
+            vocabulary = self.vocabularies.get(feature)
+            if vocabulary is None:
+                columns.append(column.to_numpy(dtype=np.float64))
+            else:
+                columns.append(pd.Categorical(column, categories=vocabulary).codes.astype(np.float64))
+        return np.column_stack(columns)
+
+    def encode(self, cases, out=None):
+        """Encode a batch of classification dicts into a (len(cases), n_features) float32 array."""
+        if out is None:
+            out = np.empty((len(cases), len(self.features)), dtype=np.float32)
+        for row, case in enumerate(cases):
+            for col, feature in enumerate(self.features):
+                value = case.get(feature)
+                lookup = self._lookups[col]
+                if lookup is not None:
+                    out[row, col] = lookup.get(value if isinstance(value, str) else str(value), self._unknown_codes[col])
+                else:
+                    try:
+                        out[row, col] = float(value)
+                    except (TypeError, ValueError):
+                        out[row, col] = self._unknown_codes[col]
+        return out
+
+class KnnIndex:
+    """Prebuilt KNN artifact: scaler parameters, vocabularies and memory-mapped arrays."""
+
+    def __init__(self, path, manifest, features, fraud_scores, ivf=None):
+        self.path = path
+        self.manifest = manifest
+        self.feature_names = manifest['features']
+        self.vocabularies = manifest['vocabularies']
+        self.mean = np.asarray(manifest['scaler']['mean'], dtype=np.float64)
+        self.scale = np.asarray(manifest['scaler']['scale'], dtype=np.float64)
+        self.features = features
+        self.fraud_scores = fraud_scores
+        self.ivf = ivf
+        # Unparseable numeric values fall back to the training mean, i.e. 0 after scaling
+        numeric_defaults = {feature: mean for feature, mean in zip(self.feature_names, self.mean)}
+        self.encoder = CategoricalEncoder(self.feature_names, self.vocabularies, numeric_defaults)
+        self._mean32 = self.mean.astype(np.float32)
+        self._scale32 = self.scale.astype(np.float32)
+
+    def encode(self, cases, out=None):
+        """Encode and standardise classification dicts in place in one float32 array."""
+        out = self.encoder.encode(cases, out)
+        out -= self._mean32
+        out /= self._scale32
+        return out
+
+    def __len__(self):
+        return self.features.shape[0]
+
+# Neighbour-search backends. Both expose kneighbors(queries, n_neighbors) and
+# return (distances, indices) like sklearn, so detect_fraud can swap them freely.
+BACKENDS = ('exact', 'ivf')
+
+class ExactSearch:
+    """Brute-force euclidean search over every indexed row."""
+
+    def __init__(self, features):
+        from sklearn.neighbors import NearestNeighbors  # deferred: importing sklearn takes over a second
+
+        self._knn = NearestNeighbors(metric='euclidean', algorithm='brute')
+        self._knn.fit(features)
+
+    def kneighbors(self, queries, n_neighbors):
+        return self._knn.kneighbors(queries, n_neighbors=n_neighbors)
+
+def _squared_distances(X, centroids):
+    return (np.einsum('ij,ij->i', X, X)[:, None]
+            - 2.0 * X @ centroids.T
+            + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+
+# Row-by-centroid distance cells computed at once (32 MB of float32)
+DISTANCE_BLOCK = 1 << 23
+
+def _nearest_centroids(X, centroids, chunk_size=65536):
+    """Closest centroid of every row, computed a chunk of rows at a time so memory stays bounded."""
+    step = max(1, min(chunk_size, DISTANCE_BLOCK // len(centroids)))
+    assignment = np.empty(X.shape[0], dtype=np.int64)
+    for start in range(0, X.shape[0], step):
+        chunk = np.asarray(X[start:start + step], dtype=np.float32)
+        assignment[start:start + step] = _squared_distances(chunk, centroids).argmin(axis=1)
+    return assignment
+
+def train_ivf(features, n_lists=None, iterations=10, sample_size=None, seed=0, chunk_size=65536):
+    """Cluster rows with k-means and return (centroids, order, offsets) for an IVF index.
+
+    order lists row ids grouped by cluster; the rows of cluster c are
+    order[offsets[c]:offsets[c + 1]].
+    """
+    n_rows = features.shape[0]
+    if not n_lists:
+        n_lists = max(1, int(np.sqrt(n_rows)))
+    n_lists = min(n_lists, n_rows)
+    rng = np.random.default_rng(seed)
+
+    # k-means on a sample is enough to place the centroids
+    sample_size = sample_size or min(n_rows, 256 * n_lists)
+    sample = np.asarray(features[np.sort(rng.choice(n_rows, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroids(sample, centroids, chunk_size)
+        counts = np.bincount(assignment, minlength=n_lists)
+        for j in range(sample.shape[1]):
+            centroids[:, j] = np.bincount(assignment, weights=sample[:, j], minlength=n_lists) / np.maximum(counts, 1)
+        # Re-seed empty clusters on random sample points
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.integers(sample_size, size=len(empty))]
+
+    assignment = _nearest_centroids(features, centroids, chunk_size)
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+    return centroids, order, offsets
+
+class IVFSearch:
+    """Inverted-file approximate search: probe only the n_probe lists closest to the query.
+
+    n_probe is the recall/latency knob; n_probe == number of lists is exact.
+    """
+
+    def __init__(self, features, centroids, order, offsets, n_probe=8):
+        self.features = features
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.order = order
+        self.offsets = offsets
+        self.n_probe = max(1, min(n_probe, len(self.centroids)))
+
+    @classmethod
+    def from_index(cls, index, n_probe=8, n_lists=None):
+        """Use the lists stored in the artifact, or train them now if it has none."""
+        if index.ivf is not None:
+            centroids, order, offsets = index.ivf
+        else:
+            centroids, order, offsets = train_ivf(index.features, n_lists)
+        return cls(index.features, centroids, order, offsets, n_probe)
+
+    def kneighbors(self, queries, n_neighbors):
+        # Same contract as the exact backend: never return unfilled neighbour slots
+        if n_neighbors > len(self.features):
+            raise ValueError(f"Expected n_neighbors <= n_samples_fit, but n_neighbors = {n_neighbors}, "
+                             f"n_samples_fit = {len(self.features)}")
+        queries = np.asarray(queries, dtype=np.float32)
+        list_order = np.argsort(_squared_distances(queries, self.centroids), axis=1)
+        sizes = np.diff(self.offsets)
+        distances = np.empty((len(queries), n_neighbors), dtype=np.float64)
+        indices = np.empty((len(queries), n_neighbors), dtype=np.int64)
+        for i, query in enumerate(queries):
+            # Probe n_probe lists, and keep going if they hold fewer than n_neighbors rows
+            probes = list_order[i, :self.n_probe]
+            extra = self.n_probe
+            while sizes[probes].sum() < n_neighbors and extra < len(list_order[i]):
+                probes = list_order[i, :extra + 1]
+                extra += 1
+            # Sorted row ids keep reads from the memory-mapped matrix sequential
+            rows = np.sort(np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes]))
+            diff = np.asarray(self.features[rows], dtype=np.float32) - query
+            candidate_distances = np.einsum('ij,ij->i', diff, diff)
+            top = np.argpartition(candidate_distances, n_neighbors - 1)[:n_neighbors]
+            top = top[np.argsort(candidate_distances[top], kind='stable')]
+            distances[i] = np.sqrt(candidate_distances[top])
+            indices[i] = rows[top]
+        return distances, indices
+
+def make_search(index, backend='exact', n_probe=8):
+    """Build the neighbour-search backend named by backend over a loaded KnnIndex."""
+    if backend == 'exact':
+        return ExactSearch(index.features)
+    if backend == 'ivf':
+        return IVFSearch.from_index(index, n_probe)
+    raise ValueError(f"Unknown KNN backend {backend!r}, expected one of {BACKENDS}")
+
+def recall_at_k(exact_distances, approx_distances, eps=1e-5):
+    """Share of approximate neighbours at least as close as the exact k-th neighbour.
+
+    Distance-based so ties between identical encoded cases are not counted as misses.
+    """
+    kth = exact_distances[:, -1:]
+    return float((approx_distances <= kth + eps).mean())
+
+def build_index(csv_path=DEFAULT_CSV, index_dir=DEFAULT_INDEX_DIR, features=FEATURES, ivf_lists=None,
+                dedup_path=None):
+    """Encode, scale and write the classified dataset as a versioned, mmappable artifact.
+
+    csv_path may also be a corpus store, of which only the feature and score
+    columns are read. dedup_path, a near_duplicates.py mapping, leaves out every
+    document but the canonical one of each cluster so repeated orders are not
+    counted as several neighbours. ivf_lists also stores IVF lists for the 'ivf'
+    backend; 0 picks about sqrt(rows) of them.
+    """
+    store = corpus_store.is_store(csv_path)
+    source_hash = corpus_store.fingerprint(csv_path) if store else source_manifest.file_sha256(csv_path)
+    if dedup_path:
+        # A new mapping over the same source is a new index version
+        source_hash = hashlib.sha256((source_hash + source_manifest.file_sha256(dedup_path)).encode('ascii')).hexdigest()
+    # The build parameters are part of the version too, so rebuilding the same
+    # source differently never touches files running workers have mapped
+    parameters = hashlib.sha256(json.dumps({'features': list(features), 'ivf_lists': ivf_lists}).encode('utf-8'))
+    version = f"v{INDEX_FORMAT_VERSION}-{source_hash[:12]}-{parameters.hexdigest()[:8]}"
+    version_dir = os.path.join(index_dir, version)
+
+    if not os.path.isdir(version_dir):
+        columns = features + ['FraudRiskScore'] + (['PDF Name'] if dedup_path else [])
+        data = corpus_store.read(csv_path, columns=columns) if store else pd.read_csv(csv_path, usecols=columns)
+        if dedup_path:
+            from near_duplicates import load_duplicates
+            data = data[~data['PDF Name'].isin(load_duplicates(dedup_path))].reset_index(drop=True)
+        _write_version(data, index_dir, version, csv_path, source_hash, features, ivf_lists)
+
+    # Point CURRENT at the new version atomically so running workers never see a half-written index
+    current_tmp = os.path.join(index_dir, f'CURRENT.{os.getpid()}.tmp')
+    with open(current_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(index_dir, 'CURRENT'))
+    return version_dir
+
+def _write_version(data, index_dir, version, csv_path, source_hash, features, ivf_lists):
+    """Write one index version into a private directory and rename it into place.
+
+    Workers that find no index build it at the same time; each writes its own
+    directory and the first rename wins.
+    """
+    encoder = CategoricalEncoder.fit(data, features)
+    X = encoder.encode_frame(data)
+
+    # Same statistics StandardScaler would fit; zero-variance columns keep a scale of 1
+    mean = np.nanmean(X, axis=0)
+    std = np.nanstd(X, axis=0)
+    scale = np.where(std == 0, 1.0, std)
+    X_scaled = np.ascontiguousarray((X - mean) / scale, dtype=np.float32)
+
+    tmp_dir = os.path.join(index_dir, f'.{version}.{os.getpid()}.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    np.save(os.path.join(tmp_dir, 'features.npy'), X_scaled)
+    np.save(os.path.join(tmp_dir, 'fraud_scores.npy'), data['FraudRiskScore'].to_numpy(dtype=np.float64))
+    manifest = {
+        'format_version': INDEX_FORMAT_VERSION,
+        'version': version,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source': {'path': os.path.basename(csv_path), 'sha256': source_hash, 'rows': len(data)},
+        'features': list(features),
+        'vocabularies': encoder.vocabularies,
+        'scaler': {'mean': mean.tolist(), 'scale': scale.tolist()},
+        'ivf': None,
+    }
+    if ivf_lists is not None:
+        centroids, order, offsets = train_ivf(X_scaled, ivf_lists)
+        np.save(os.path.join(tmp_dir, 'ivf_centroids.npy'), centroids)
+        np.save(os.path.join(tmp_dir, 'ivf_order.npy'), order)
+        np.save(os.path.join(tmp_dir, 'ivf_offsets.npy'), offsets)
+        manifest['ivf'] = {'lists': len(centroids)}
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    try:
+        os.replace(tmp_dir, os.path.join(index_dir, version))
+    except OSError:
+        # Another worker finished the same version first
+        if not os.path.isdir(os.path.join(index_dir, version)):
+            raise
+        shutil.rmtree(tmp_dir)
+
+def has_index(index_dir=DEFAULT_INDEX_DIR):
+    return os.path.exists(os.path.join(index_dir, 'CURRENT'))
+
+def load_index(index_dir=DEFAULT_INDEX_DIR):
+    """Memory-map the current index version so every worker shares the same pages."""
+    with open(os.path.join(index_dir, 'CURRENT'), encoding='utf-8') as f:
+        version_dir = os.path.join(index_dir, f.read().strip())
+    with open(os.path.join(version_dir, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != INDEX_FORMAT_VERSION:
+        raise ValueError(f"KNN index {version_dir} has format version {manifest['format_version']}, "
+                         f"expected {INDEX_FORMAT_VERSION}; rebuild it with knn_index.py")
+
+    features = np.load(os.path.join(version_dir, 'features.npy'), mmap_mode='r')
+    fraud_scores = np.load(os.path.join(version_dir, 'fraud_scores.npy'), mmap_mode='r')
+    ivf = None
+    if manifest.get('ivf'):
+        ivf = tuple(np.load(os.path.join(version_dir, f'ivf_{name}.npy'), mmap_mode='r')
+                    for name in ('centroids', 'order', 'offsets'))
+    return KnnIndex(version_dir, manifest, features, fraud_scores, ivf)
+
+def benchmark(features, n_queries=1000, n_neighbors=5, n_probes=(1, 2, 4, 8, 16), n_lists=None, seed=0):
+    """Compare IVF recall@k and per-query latency against exact search."""
+    rng = np.random.default_rng(seed)
+    # Perturbed copies of indexed rows, so queries look like real cases
+    queries = np.asarray(features[rng.choice(features.shape[0], n_queries)], dtype=np.float32)
+    queries += rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+
+    exact = ExactSearch(features)
+    start = time.perf_counter()
+    exact_distances, _ = exact.kneighbors(queries, n_neighbors)
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+    print(f"exact            recall@{n_neighbors}=1.000  {exact_ms:.3f} ms/query")
+
+    start = time.perf_counter()
+    centroids, order, offsets = train_ivf(features, n_lists, seed=seed)
+    print(f"ivf trained {len(centroids)} lists in {time.perf_counter() - start:.2f}s")
+    for n_probe in n_probes:
+        ivf = IVFSearch(features, centroids, order, offsets, n_probe)
+        start = time.perf_counter()
+        approx_distances, _ = ivf.kneighbors(queries, n_neighbors)
+        ivf_ms = (time.perf_counter() - start) * 1000 / n_queries
+        recall = recall_at_k(exact_distances, approx_distances)
+        print(f"ivf n_probe={n_probe:<4} recall@{n_neighbors}={recall:.3f}  {ivf_ms:.3f} ms/query")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the prebuilt KNN index used by fraud_detection_api.")
+    parser.add_argument('--csv', default=DEFAULT_CSV, help="classified dataset with FraudRiskScore (CSV or corpus store)")
+    parser.add_argument('--out', default=DEFAULT_INDEX_DIR, help="index directory")
+    parser.add_argument('--dedup', metavar='MAPPING_CSV', help="near_duplicates.py output; index canonical documents only")
+    parser.add_argument('--ivf-lists', type=int, help="also train and store IVF lists for the 'ivf' backend (0: about sqrt(rows))")
+    parser.add_argument('--benchmark', action='store_true', help="report IVF recall@5 and latency against exact search")
+    parser.add_argument('--synthetic', type=int, help="benchmark on this many random clustered rows instead of the index")
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        if args.synthetic:
+            rng = np.random.default_rng(0)
+            centers = rng.normal(size=(256, len(FEATURES)))
+            rows = centers[rng.integers(len(centers), size=args.synthetic)]
+            features = (rows + rng.normal(scale=0.3, size=rows.shape)).astype(np.float32)
+        else:
+            features = load_index(args.out).features
+        benchmark(features, args.queries, n_lists=args.ivf_lists)
+    else:
+        start = time.perf_counter()
+        path = build_index(args.csv, args.out, ivf_lists=args.ivf_lists, dedup_path=args.dedup)
+        index = load_index(args.out)
+        print(f"Built KNN index {path} with {len(index)} rows in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,11 @@
+import re
+
+# Patterns for references in tribunal orders, shared by the offline tools and
+# the API so neither has to import the other.
+
+# Case numbers as orders cite them: MACT/MACP/M.C.O.P./CIS ... No. 58 of 2015,
+# 58/2015, or with a filing date before the year (58 of 12.03.2015). Groups:
+# the number and the year.
+CASE_NUMBER_PATTERN = re.compile(
+    r'\b(?:M\.?\s?A\.?\s?C\.?\s?[TP]|M\.?\s?C\.?\s?O\.?\s?P|CIS|Claim\s+Petition|Petition|Case)\b'
+    r'[^0-9]{0,25}?(\d{1,6})\s*(?:/|of)\s*(?:\d{1,2}\.\d{1,2}\.)?(\d{4})\b', re.IGNORECASE)
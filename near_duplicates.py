@@ -0,0 +1,173 @@
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import classifier
+from legal_text import CASE_NUMBER_PATTERN
+
+# Documents are compared as sets of SHINGLE_WORDS-word shingles of their
+# lowercased cleaned text. MinHash estimates the Jaccard similarity of two such
+# sets from NUM_PERM hash minima; LSH splits each signature into BANDS bands and
+# only documents that agree on a whole band are ever compared, so the work grows
+# with the number of documents rather than the number of pairs.
+SHINGLE_WORDS = 3  # short shingles keep OCR variants (a misread word every ~50) above THRESHOLD
+NUM_PERM = 128
+BANDS = 16  # 8 rows per band: pairs at ~0.7 similarity or above almost always share one
+THRESHOLD = 0.8  # estimated similarity at which two documents count as the same order
+SEED = 1
+DEFAULT_OUTPUT = 'near_duplicates.csv'
+# Templated orders from one bench can share most of their text, so two
+# documents whose headers cite case numbers (see legal_text.CASE_NUMBER_PATTERN)
+# with none in common are never merged, however similar.
+HEADER_CHARS = 1500
+SHINGLE_BLOCK = 4096  # shingles hashed per step, bounding memory on very long orders
+TOKEN_CACHE_SIZE = 1 << 20
+
+class MinHasher:
+    """MinHash signatures of word-shingled text, reproducible across runs and processes."""
+
+    def __init__(self, num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS, seed=SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        # h(x) = (a*x + b) mod 2**64 with odd a, keeping the top 32 bits
+        self.a = rng.integers(1, 2**63, num_perm, dtype=np.uint64)[:, None] | np.uint64(1)
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)[:, None]
+        self._token_hashes = {}
+
+    def _token_hash(self, token):
+        value = self._token_hashes.get(token)
+        if value is None:
+            if len(self._token_hashes) >= TOKEN_CACHE_SIZE:
+                self._token_hashes.clear()
+            value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+            self._token_hashes[token] = value
+        return value
+
+    def shingles(self, text):
+        """Distinct 64-bit shingle hashes of text; a text shorter than one shingle is one shingle."""
+        tokens = np.array([self._token_hash(token) for token in text.lower().split()], dtype=np.uint64)
+        if len(tokens) == 0:
+            return tokens
+        k = min(self.shingle_words, len(tokens))
+        count = len(tokens) - k + 1
+        # Polynomial hash of each window, wrapping mod 2**64
+        hashes = tokens[:count].copy()
+        for offset in range(1, k):
+            hashes = hashes * np.uint64(1099511628211) + tokens[offset:offset + count]
+        return np.unique(hashes)
+
+    def signature(self, text):
+        """uint32 MinHash signature, or None for a document without text."""
+        shingles = self.shingles(text)
+        if len(shingles) == 0:
+            return None
+        signature = np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        for start in range(0, len(shingles), SHINGLE_BLOCK):
+            block = shingles[None, start:start + SHINGLE_BLOCK]
+            values = ((self.a * block + self.b) >> np.uint64(32)).astype(np.uint32)
+            np.minimum(signature, values.min(axis=1), out=signature)
+        return signature
+
+def case_numbers(text):
+    """(number, year) pairs cited in a document's header."""
+    return frozenset((int(number), year) for number, year in CASE_NUMBER_PATTERN.findall(text[:HEADER_CHARS]))
+
+def find_clusters(signatures, bands=BANDS, threshold=THRESHOLD, cases=None):
+    """Union-find root per row of signatures, joining rows whose estimated similarity reaches threshold.
+
+    Within each band, rows with identical band values form a bucket and each
+    row is checked against its bucket's first row, so a band costs one sort.
+    cases, if given, holds each row's case_numbers; rows citing disjoint ones
+    are kept apart.
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    parent = np.arange(n)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    everyone = np.arange(n)
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leaders = first[inverse.ravel()]
+        candidates = np.nonzero(leaders != everyone)[0]
+        if len(candidates) == 0:
+            continue
+        similarity = (signatures[candidates] == signatures[leaders[candidates]]).mean(axis=1)
+        for i, j in zip(candidates[similarity >= threshold], leaders[candidates][similarity >= threshold]):
+            if cases is not None and cases[i] and cases[j] and cases[i].isdisjoint(cases[j]):
+                continue
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(i) for i in range(n)])
+
+def find_near_duplicates(chunks, hasher=None, bands=BANDS, threshold=THRESHOLD):
+    """Duplicate clusters in a stream of frames with 'PDF Name' and 'cleaned_doc' or 'Extracted Text'.
+
+    Returns a frame with one row per document in a cluster of two or more:
+    PDF Name, canonical (the PDF Name standing in for the whole cluster, its
+    longest document), cluster and estimated similarity to the canonical.
+    """
+    hasher = hasher or MinHasher()
+    names, lengths, cases, signatures = [], [], [], []
+    for chunk in chunks:
+        if 'cleaned_doc' in chunk.columns:
+            docs = chunk['cleaned_doc'].fillna('')
+        else:
+            docs = classifier.clean_documents(chunk['Extracted Text'])
+        for name, text in zip(chunk['PDF Name'], docs):
+            signature = hasher.signature(text)
+            if signature is not None:
+                names.append(name)
+                lengths.append(len(text))
+                cases.append(case_numbers(text))
+                signatures.append(signature)
+    columns = ['PDF Name', 'canonical', 'cluster', 'similarity']
+    if not signatures:
+        return pd.DataFrame(columns=columns)
+    signatures = np.vstack(signatures)
+    roots = find_clusters(signatures, bands, threshold, cases)
+
+    members = {}
+    for i, root in enumerate(roots):
+        members.setdefault(root, []).append(i)
+    rows = []
+    for cluster, group in enumerate(group for group in members.values() if len(group) > 1):
+        canonical = max(group, key=lambda i: (lengths[i], -i))
+        for i in group:
+            rows.append([names[i], names[canonical], cluster,
+                         float((signatures[i] == signatures[canonical]).mean())])
+    return pd.DataFrame(rows, columns=columns)
+
+def load_duplicates(mapping_csv):
+    """PDF Names that a find_near_duplicates mapping folds into another document."""
+    mapping = pd.read_csv(mapping_csv)
+    return set(mapping.loc[mapping['PDF Name'] != mapping['canonical'], 'PDF Name'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate orders with MinHash/LSH.")
+    parser.add_argument('--input', nargs='+', default=[classifier.DEFAULT_INPUT],
+                        help="CSV(s) or corpus stores with PDF Name and Extracted Text (or cleaned_doc)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="CSV mapping each duplicate to its canonical")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM)
+    parser.add_argument('--bands', type=int, default=BANDS)
+    parser.add_argument('--chunksize', type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    mapping = find_near_duplicates(classifier.iter_chunks(args.input, args.chunksize),
+                                   MinHasher(args.num_perm), args.bands, args.threshold)
+    mapping.to_csv(args.output, index=False)
+    duplicates = int((mapping['PDF Name'] != mapping['canonical']).sum())
+    print(f"{mapping['cluster'].nunique()} clusters, {duplicates} duplicate documents, "
+          f"written to {args.output} in {time.perf_counter() - start:.2f}s")
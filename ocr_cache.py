@@ -0,0 +1,154 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# One cache file next to this module, so the scrapers and the eCourts tools share it
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_cache.sqlite3')
+# Least recently used entries are dropped once the stored text exceeds this
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Entries deleted per statement when evicting
+EVICT_BATCH = 256
+# Hits only note the time in memory; last_used is written for this many keys
+# at once, or sooner alongside a put or stats(). Losing a few on exit only
+# shifts eviction order.
+TOUCH_BATCH = 64
+
+class OcrCache:
+    """Persistent OCR results keyed by the exact page image plus OCR engine and config.
+
+    Backed by SQLite in WAL mode so concurrent runs and worker processes can
+    share one file. Hashes are exact (pixels or file bytes): a perceptual hash
+    could hand one order's text to a near-identical page from another case.
+
+    Triggers keep the total text size in a one-row table, so inserts don't
+    have to sum the whole cache to decide whether to evict.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self._touched = {}
+
+    def _connect(self):
+        # Connections can't cross a fork, so each worker process opens its own
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                             "size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS ocr_size (total INTEGER NOT NULL)")
+            self._db.execute("CREATE TRIGGER IF NOT EXISTS ocr_size_insert AFTER INSERT ON ocr "
+                             "BEGIN UPDATE ocr_size SET total = total + new.size; END")
+            self._db.execute("CREATE TRIGGER IF NOT EXISTS ocr_size_delete AFTER DELETE ON ocr "
+                             "BEGIN UPDATE ocr_size SET total = total - old.size; END")
+            self._db.execute("CREATE TRIGGER IF NOT EXISTS ocr_size_update AFTER UPDATE OF size ON ocr "
+                             "BEGIN UPDATE ocr_size SET total = total + new.size - old.size; END")
+            # Caches written before the running total existed start from a full sum, once
+            self._db.execute("INSERT INTO ocr_size SELECT COALESCE(SUM(size), 0) FROM ocr "
+                             "WHERE NOT EXISTS (SELECT 1 FROM ocr_size)")
+            self._db.commit()
+            # Hits noted before a fork are the parent's to write
+            self._touched = {}
+            self._pid = os.getpid()
+        return self._db
+
+    @staticmethod
+    def key(image, engine, config=""):
+        """Cache key for an image (numpy array, PIL image, file path or encoded bytes)."""
+        digest = hashlib.sha256(f"{engine}\0{config}\0".encode('utf-8'))
+        if isinstance(image, (str, os.PathLike)):
+            with open(image, 'rb') as f:
+                digest.update(f.read())
+        elif isinstance(image, (bytes, bytearray)):
+            digest.update(image)
+        else:
+            pixels = np.ascontiguousarray(np.asarray(image))
+            digest.update(f"{pixels.shape}\0{pixels.dtype}\0".encode('utf-8'))
+            digest.update(pixels.data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._write_touched(db)
+                db.commit()
+            return row[0]
+
+    def put(self, key, text):
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT INTO ocr (key, text, size, last_used) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (key) DO UPDATE SET text = excluded.text, size = excluded.size, "
+                       "last_used = excluded.last_used",
+                       (key, text, len(text.encode('utf-8')), time.time()))
+            self._write_touched(db)
+            self._evict(db)
+            db.commit()
+
+    def flush(self):
+        """Write last_used for hits that are still only noted in memory."""
+        with self._lock:
+            if self._touched:
+                db = self._connect()
+                self._write_touched(db)
+                db.commit()
+
+    def _write_touched(self, db):
+        db.executemany("UPDATE ocr SET last_used = ? WHERE key = ?",
+                       [(used, key) for key, used in self._touched.items()])
+        self._touched.clear()
+
+    def _evict(self, db):
+        total = db.execute("SELECT total FROM ocr_size").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so a full cache doesn't evict on every insert
+        target = self.max_bytes * 0.9
+        while total > target:
+            deleted = db.execute("DELETE FROM ocr WHERE key IN (SELECT key FROM ocr ORDER BY last_used LIMIT ?)",
+                                 (EVICT_BATCH,)).rowcount
+            if not deleted:
+                break
+            total = db.execute("SELECT total FROM ocr_size").fetchone()[0]
+
+    def cached(self, image, engine, config, ocr_fn):
+        """Return the cached text for image, running ocr_fn(image) and storing its result on a miss."""
+        key = self.key(image, engine, config)
+        text = self.get(key)
+        if text is None:
+            text = ocr_fn(image)
+            if text is not None:
+                self.put(key, text)
+        return text
+
+    def stats(self):
+        self.flush()
+        with self._lock:
+            db = self._connect()
+            entries = db.execute("SELECT COUNT(*) FROM ocr").fetchone()[0]
+            size = db.execute("SELECT total FROM ocr_size").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,35 +1,181 @@
 import os
 import csv
-import PyPDF2
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pyarrow.parquet as pq
+import pdf_extraction
+import corpus_store
+import source_manifest
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file using PyPDF2."""
+def extract_text_from_pdf(pdf_path, workers=pdf_extraction.PAGE_WORKERS):
+    """Extract text from a PDF file using PyPDF2, splitting large files across processes."""
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n\n"
+        text = pdf_extraction.extract_text_from_pdf(pdf_path, separator="\n\n", workers=workers)
         return text.strip()
     except Exception as e:
         print(f"Error extracting text from PDF {pdf_path}: {e}")
         return None
 
-def process_folder(folder_path, output_csv):
-    """Process all PDFs in a folder and save results to a CSV file."""
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['PDF Name', 'Extracted Text'])
-        
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith('.pdf'):
-                pdf_path = os.path.join(folder_path, filename)
-                extracted_text = extract_text_from_pdf(pdf_path)
-                if extracted_text:
-                    csv_writer.writerow([filename, extracted_text])
-                    print(f"Processed: {filename}")
+# Manifest kept next to the output CSV: one row per processed file, appended as
+# files finish, so an interrupted run can be resumed. Later rows win. 'path' is
+# the file name within the folder, so the folder may be given any way.
+MANIFEST_FIELDS = ['path', 'size', 'mtime_ns', 'sha256', 'status']
+
+def manifest_path_for(output_csv):
+    root, _ = os.path.splitext(output_csv)
+    return root + '.manifest.csv'
+
+def load_manifest(manifest_path):
+    """Latest manifest entry per file name; older manifests recorded the path as given."""
+    return {os.path.basename(path): entry for path, entry in source_manifest.load_entries(manifest_path).items()}
+
+def drop_superseded(output_csv, names):
+    """Rewrite output_csv keeping only the last row of each PDF Name in names."""
+    counts = Counter()
+    with open(output_csv, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if row and row[0] in names:
+                counts[row[0]] += 1
+    with open(output_csv, newline='', encoding='utf-8') as f, \
+         open(output_csv + '.tmp', 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        for row in csv.reader(f):
+            if row and counts[row[0]] > 1:
+                counts[row[0]] -= 1
+                continue
+            writer.writerow(row)
+    os.replace(output_csv + '.tmp', output_csv)
+
+def drop_superseded_store(store, district, names):
+    """drop_superseded for one district of a corpus store; only part files holding an older row are rewritten."""
+    directory = corpus_store.district_dir(store, district)
+    parts = sorted(name for name in os.listdir(directory) if name.endswith('.parquet') and not name.startswith('.'))
+    part_names = [pq.read_table(os.path.join(directory, part), columns=['PDF Name']).column(0).to_pylist()
+                  for part in parts]
+    counts = Counter(name for names_in_part in part_names for name in names_in_part if name in names)
+    for part, names_in_part in zip(parts, part_names):
+        keep = []
+        for name in names_in_part:
+            keep.append(counts[name] <= 1)
+            if counts[name] > 1:
+                counts[name] -= 1
+        if not all(keep):
+            frame = pq.read_table(os.path.join(directory, part)).to_pandas()[keep]
+            if len(frame):
+                corpus_store.write_frame(store, frame, district)
+            os.remove(os.path.join(directory, part))
+
+def ingest_pdf(pdf_path, entry=None, page_workers=1):
+    """Hash and extract one PDF. Returns (sha256, status, text); runs in a worker process."""
+    state, _, sha256 = source_manifest.check_file(pdf_path, entry)
+    if state != 'changed':
+        # Touched but not changed since it was last processed
+        return sha256, 'unchanged', None
+    text = extract_text_from_pdf(pdf_path, workers=page_workers)
+    return sha256, ('ok' if text else 'failed'), text
+
+def process_folder(folder_path, output_csv, workers=None, ordered=False, district=None):
+    """Process all PDFs in a folder and save results to a CSV file.
+
+    PDFs are spread over a process pool with one worker per core. Rows are
+    written as files finish, or in file-name order with ordered=True. A
+    manifest next to the CSV records each file's size, mtime, hash and status,
+    so a rerun appends to the CSV, skips files already processed and retries
+    only failures and changed files. A changed file's new row replaces its
+    earlier one once the run is done.
+
+    output_csv may instead be a corpus store directory; rows then go to the
+    district partition (named after the folder unless given), with the
+    manifest inside it, and a file is only marked done in the manifest once
+    its row has been written out as part of a Parquet part file.
+    """
+    workers = workers or os.cpu_count() or 1
+    store = corpus_store.is_store(output_csv)
+    if store:
+        district = district or corpus_store.district_name(folder_path)
+        manifest_path = os.path.join(corpus_store.district_dir(output_csv, district), '_manifest.csv')
+    else:
+        manifest_path = manifest_path_for(output_csv)
+    manifest = load_manifest(manifest_path)
+    resume = bool(manifest) and os.path.exists(output_csv)
+
+    jobs = []
+    skipped = 0
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.lower().endswith('.pdf'):
+            pdf_path = os.path.join(folder_path, filename)
+            stat = os.stat(pdf_path)
+            entry = manifest.get(filename) if resume else None
+            done = entry is not None and entry['status'] in ('ok', 'unchanged')
+            if done and source_manifest.stat_matches(entry, stat):
+                skipped += 1
+                continue
+            jobs.append((filename, pdf_path, stat, entry if done else None))
+    print(f"{len(jobs)} PDFs to process, {skipped} already processed")
+
+    mode = 'a' if resume else 'w'
+    store_writer = corpus_store.CorpusWriter(output_csv, district, overwrite=not resume) if store else None
+    with (nullcontext() if store else open(output_csv, mode, newline='', encoding='utf-8')) as csvfile, \
+         open(manifest_path, mode, newline='', encoding='utf-8') as manifest_file:
+        csv_writer = None if store else csv.writer(csvfile)
+        manifest_writer = csv.DictWriter(manifest_file, MANIFEST_FIELDS)
+        if not resume:
+            if csv_writer:
+                csv_writer.writerow(['PDF Name', 'Extracted Text'])
+            manifest_writer.writeheader()
+        # Manifest rows wait here until their text is on disk
+        pending = []
+        # Files extracted again because they changed; their earlier rows go at the end
+        replaced = set()
+
+        def flush_manifest(force=False):
+            if store_writer is None or store_writer.flush(force):
+                manifest_writer.writerows(pending)
+                pending.clear()
+            manifest_file.flush()
+
+        def record(job, result):
+            filename, pdf_path, stat, previous = job
+            try:
+                sha256, status, extracted_text = result()
+            except Exception as e:
+                print(f"Error processing PDF {pdf_path}: {e}")
+                sha256, status, extracted_text = '', 'failed', None
+            if status == 'ok':
+                if store_writer:
+                    store_writer.append({'PDF Name': filename, 'Extracted Text': extracted_text})
                 else:
-                    print(f"Failed to process: {filename}")
+                    csv_writer.writerow([filename, extracted_text])
+                print(f"Processed: {filename}")
+                if previous is not None:
+                    replaced.add(filename)
+            elif status == 'failed':
+                print(f"Failed to process: {filename}")
+            pending.append({'path': filename, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                            'sha256': sha256, 'status': status})
+            # Flush per file so a crash loses at most the file in progress
+            # (or, for a store, the rows not yet written as a part file)
+            if csvfile:
+                csvfile.flush()
+            flush_manifest()
+
+        if workers == 1:
+            for job in jobs:
+                record(job, lambda: ingest_pdf(job[1], job[3], pdf_extraction.PAGE_WORKERS))
+        else:
+            # Files are the unit of parallelism here, so each worker extracts its pages sequentially
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(ingest_pdf, job[1], job[3]): job for job in jobs}
+                for future in (futures if ordered else as_completed(futures)):
+                    record(futures[future], future.result)
+        flush_manifest(force=True)
+    if replaced:
+        if store:
+            drop_superseded_store(output_csv, district, replaced)
+        else:
+            drop_superseded(output_csv, replaced)
+        print(f"Replaced the earlier rows of {len(replaced)} changed PDFs")
 
 if __name__ == "__main__":
     pdf_folder = r'C:\Users\hp\Downloads\Ambala\Ambala'  # Your PDF folder path
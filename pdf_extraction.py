@@ -0,0 +1,83 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+
+# Documents with at least this many pages are split across processes when
+# extract_text_from_pdf is given workers > 1; smaller ones aren't worth the overhead.
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 8  # smallest page range handed to a worker
+# Default page-parallelism for the scrapers: one process per core
+PAGE_WORKERS = os.cpu_count() or 1
+
+def _open_reader(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return PdfReader(source)
+
+def _extract_page_range(source, start, stop):
+    """Extract pages [start, stop) in a worker process, which opens the PDF itself."""
+    reader = _open_reader(source)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def iter_page_text(source, workers=1):
+    """Yield the text of each page in order.
+
+    source is a path, raw PDF bytes or a binary file object. With workers > 1
+    and at least PARALLEL_MIN_PAGES pages, page ranges are extracted in a
+    process pool while earlier pages are being consumed; closing the generator
+    early cancels the ranges that haven't started.
+    """
+    workers = min(workers, os.cpu_count() or 1)
+    if workers > 1 and hasattr(source, 'read'):
+        source = source.read()  # file objects can't be shared with worker processes
+    reader = _open_reader(source)
+    page_count = len(reader.pages)
+
+    if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    # Every task re-parses the document, so use a few large ranges per worker rather than many small ones
+    pages_per_task = max(PAGES_PER_TASK, -(-page_count // (4 * workers)))
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded window of ranges in flight so memory stays flat and an early stop wastes little work
+        pending = [pool.submit(_extract_page_range, source, start, stop) for start, stop in ranges[:2 * workers]]
+        next_range = len(pending)
+        try:
+            while pending:
+                pages = pending.pop(0).result()
+                if next_range < len(ranges):
+                    pending.append(pool.submit(_extract_page_range, source, *ranges[next_range]))
+                    next_range += 1
+                yield from pages
+        finally:
+            for future in pending:
+                future.cancel()
+
+def extract_text_from_pdf(source, separator="", max_chars=None, workers=1):
+    """Extract the text of a PDF, joining pages once at the end.
+
+    With max_chars, extraction stops after the first pages that together hold
+    at least max_chars non-whitespace characters, which is all a caller that
+    truncates the text needs.
+    """
+    parts = []
+    collected = 0
+    pages = iter_page_text(source, workers)
+    try:
+        for text in pages:
+            parts.append(text)
+            if max_chars is not None:
+                collected += sum(map(len, text.split()))
+                if collected >= max_chars:
+                    break
+    finally:
+        pages.close()
+    return separator.join(parts)
+
+def extract_text_from_bytes(pdf_content, max_chars=None):
+    """Extract text from raw PDF bytes. Kept at module level so it can run in a process pool."""
+    return extract_text_from_pdf(pdf_content, max_chars=max_chars)
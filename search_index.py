@@ -0,0 +1,402 @@
+import os
+import re
+import glob
+import json
+import math
+import time
+import uuid
+import shutil
+import argparse
+import threading
+from collections import Counter, deque
+import numpy as np
+import pandas as pd
+import corpus_store
+import source_manifest
+from legal_text import CASE_NUMBER_PATTERN
+
+# Bump when the on-disk layout changes; SearchIndex refuses other versions
+INDEX_FORMAT_VERSION = 1
+DEFAULT_INDEX_DIR = 'search_index'
+DEFAULT_PATTERN = '*-pdf-data.csv'
+CHUNK_ROWS = 1000  # source rows read at a time while indexing
+
+# The index is a directory of immutable segments, one per ingested source (a
+# district CSV, or one district of a corpus store), listed in index.json.
+# Adding a new or changed source writes its segment and then swaps index.json,
+# so a running server picks it up on its next query and never sees half of one.
+# A segment keeps, per term, its document ids (delta-encoded) and term
+# frequencies as two varint byte streams: seven bits per byte, the high bit set
+# on every byte but a value's last.
+MANIFEST = 'index.json'
+POSTINGS = 'postings.npz'
+TERMS = 'terms.txt'
+DOCS = 'docs.csv'
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Plain words are lowercased runs of letters and digits, minus a few that occur
+# in every order. On top of those, the tokenizer adds one normalised token per
+# legal reference, so "Rs.5,00,000/-" and "Rs. 500000" both give rs:500000,
+# "u/s 166(1)" gives sec:166 and sec:166(1), "M.A.C.T. No. 58 of 2015" gives
+# case:58/2015 and "TN-23-AB-1234" gives tn23ab1234. Identifiers written with
+# separators (policy and FIR numbers, dates) are also indexed with the
+# separators removed. Documents keep the words inside a reference as well; a
+# query drops them, so a reference matches however the document spelled it.
+WORD_PATTERN = re.compile(r'[^\W_]+')
+STOPWORDS = frozenset(['a', 'an', 'and', 'the', 'of', 'to', 'in', 'is', 'was', 'by', 'for', 'on', 'that', 'be', 'with'])
+AMOUNT_PATTERN = re.compile(r'\b(?:rs|inr|rupees)\.?\s*(\d[\d,]*(?:\.\d+)?)')
+SECTION_PATTERN = re.compile(r'\b(?:sections?|sec\.?|u/s\.?)\s*(\d{1,4}[a-z]?)(?:\s*\(\s*(\w{1,3})\s*\))?')
+STATE_CODES = ('an|ap|ar|as|br|cg|ch|dd|dl|dn|ga|gj|hp|hr|jh|jk|ka|kl|la|ld|mh|ml|mn|mp|mz|nl|od|or|'
+               'pb|py|rj|sk|tn|tr|ts|ua|uk|up|wb')
+VEHICLE_PATTERN = re.compile(rf'\b({STATE_CODES})[\s.-]*(\d{{1,2}})[\s.-]*([a-z]{{1,3}})[\s.-]*(\d{{1,4}})\b')
+IDENTIFIER_PATTERN = re.compile(r'\b[a-z0-9]+(?:[/-][a-z0-9]+)+\b')
+MIN_IDENTIFIER_CHARS = 6
+
+def references(lowered):
+    """(start, end, token) for every legal reference in lowercased text."""
+    found = []
+    for match in AMOUNT_PATTERN.finditer(lowered):
+        amount = match.group(1).rstrip(',').replace(',', '')
+        if '.' in amount:
+            amount = amount.rstrip('0').rstrip('.')
+        found.append((match.start(), match.end(), 'rs:' + amount))
+    for match in SECTION_PATTERN.finditer(lowered):
+        section, subsection = match.groups()
+        found.append((match.start(), match.end(), 'sec:' + section))
+        if subsection:
+            found.append((match.start(), match.end(), f'sec:{section}({subsection})'))
+    for match in CASE_NUMBER_PATTERN.finditer(lowered):
+        number, year = match.groups()
+        found.append((match.start(), match.end(), f'case:{int(number)}/{year}'))
+    vehicles = set()
+    for match in VEHICLE_PATTERN.finditer(lowered):
+        vehicles.add(''.join(match.groups()))
+        found.append((match.start(), match.end(), ''.join(match.groups())))
+    for match in IDENTIFIER_PATTERN.finditer(lowered):
+        compact = re.sub(r'[/-]', '', match.group())
+        if len(compact) >= MIN_IDENTIFIER_CHARS and any(c.isdigit() for c in compact) and compact not in vehicles:
+            found.append((match.start(), match.end(), compact))
+    return found
+
+def tokenize(text, query=False):
+    """Index terms of a document, repeated as often as they occur; with query, the terms a search requires."""
+    if not isinstance(text, str):
+        return []
+    lowered = text.lower()
+    found = references(lowered)
+    covered = bytearray(len(lowered))
+    if query:
+        for start, end, _ in found:
+            covered[start:end] = b'\x01' * (end - start)
+    tokens = [match.group() for match in WORD_PATTERN.finditer(lowered)
+              if match.group() not in STOPWORDS and not covered[match.start()]]
+    tokens.extend(token for _, _, token in found)
+    return tokens
+
+def encode_varints(values):
+    """Varint bytes of non-negative integers, and how many bytes each took."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max(initial=0))):
+        mask = lengths > k
+        low = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = (lengths[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = low | more
+    return out, lengths
+
+def decode_varints(data):
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0 or data.max() < 0x80:
+        # Every value fits in one byte, as most gaps and term frequencies do
+        return data.astype(np.int64)
+    ends = data < 0x80
+    first = np.concatenate(([True], ends[:-1]))
+    starts = np.flatnonzero(first)
+    index = np.arange(len(data))
+    position = index - np.maximum.accumulate(np.where(first, index, 0))
+    shifted = (data & 0x7f).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    return np.add.reduceat(shifted, starts).astype(np.int64)
+
+def _offsets(lengths, counts):
+    # Byte offset of each term's run of values, given bytes per value and values per term
+    ends = np.cumsum(lengths)[np.cumsum(counts) - 1] if len(counts) else np.empty(0, dtype=np.int64)
+    return np.concatenate(([0], ends)).astype(np.int64)
+
+class Segment:
+    """Postings of one source, loaded into memory."""
+
+    def __init__(self, directory, entry):
+        self.directory = directory
+        self.name = entry['name']
+        self.district = entry['district']
+        with open(os.path.join(directory, TERMS), encoding='utf-8') as f:
+            self.terms = {term: i for i, term in enumerate(f.read().split('\n')) if term}
+        with np.load(os.path.join(directory, POSTINGS)) as arrays:
+            self.doc_freqs = arrays['doc_freqs']
+            self.doc_offsets = arrays['doc_offsets']
+            self.doc_bytes = arrays['doc_bytes']
+            self.tf_offsets = arrays['tf_offsets']
+            self.tf_bytes = arrays['tf_bytes']
+            self.lengths = arrays['lengths']
+        self.names = pd.read_csv(os.path.join(directory, DOCS), dtype=str, keep_default_na=False)['PDF Name'].tolist()
+
+    def __len__(self):
+        return len(self.names)
+
+    def doc_freq(self, term):
+        i = self.terms.get(term)
+        return 0 if i is None else int(self.doc_freqs[i])
+
+    def docs(self, term):
+        i = self.terms[term]
+        return np.cumsum(decode_varints(self.doc_bytes[self.doc_offsets[i]:self.doc_offsets[i + 1]]))
+
+    def term_freqs(self, term):
+        i = self.terms[term]
+        return decode_varints(self.tf_bytes[self.tf_offsets[i]:self.tf_offsets[i + 1]])
+
+    @staticmethod
+    def write(directory, names, texts):
+        """Tokenize texts and write their postings to a new segment directory."""
+        postings = {}
+        lengths = []
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    postings[term] = entry = ([], [])
+                entry[0].append(doc)
+                entry[1].append(tf)
+        terms = sorted(postings)
+        doc_freqs = np.array([len(postings[term][0]) for term in terms], dtype=np.int64)
+        docs = np.array([doc for term in terms for doc in postings[term][0]], dtype=np.int64)
+        tfs = np.array([tf for term in terms for tf in postings[term][1]], dtype=np.int64)
+        # Doc ids are increasing within a term, so store each as the gap from the previous one
+        gaps = np.diff(docs, prepend=0)
+        term_starts = np.cumsum(doc_freqs) - doc_freqs
+        gaps[term_starts] = docs[term_starts]
+        doc_bytes, doc_lengths = encode_varints(gaps)
+        tf_bytes, tf_lengths = encode_varints(tfs)
+
+        os.makedirs(directory)
+        with open(os.path.join(directory, TERMS), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(terms))
+        np.savez(os.path.join(directory, POSTINGS), doc_freqs=doc_freqs.astype(np.uint32),
+                 doc_offsets=_offsets(doc_lengths, doc_freqs), doc_bytes=doc_bytes,
+                 tf_offsets=_offsets(tf_lengths, doc_freqs), tf_bytes=tf_bytes,
+                 lengths=np.array(lengths, dtype=np.uint32))
+        pd.DataFrame({'PDF Name': names}).to_csv(os.path.join(directory, DOCS), index=False)
+        return {'docs': len(names), 'terms': len(terms), 'bytes': len(doc_bytes) + len(tf_bytes)}
+
+def _read_manifest(index_dir):
+    path = os.path.join(index_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'format_version': INDEX_FORMAT_VERSION, 'segments': []}
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Search index {index_dir} has format version {manifest['format_version']}, "
+                         f"expected {INDEX_FORMAT_VERSION}; rebuild it with search_index.py --rebuild")
+    return manifest
+
+def _write_manifest(index_dir, manifest):
+    tmp = os.path.join(index_dir, f'{MANIFEST}.{os.getpid()}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(index_dir, MANIFEST))
+
+def _check_csv(path, previous):
+    state, stat, sha256 = source_manifest.check_file(path, previous)
+    return state, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+
+def _check_district(directory, previous):
+    sha256 = corpus_store.fingerprint(directory)
+    return ('unchanged' if previous and previous.get('sha256') == sha256 else 'changed'), {'sha256': sha256}
+
+def iter_sources(inputs):
+    """(source key, district, check fn, frames fn) for each CSV, and for each district of a corpus store.
+
+    check fn takes the source's previous manifest entry and returns its state
+    ('unchanged', 'touched' or 'changed', as source_manifest.check_file) and
+    the fields to record for it.
+    """
+    for path in inputs:
+        if corpus_store.is_store(path):
+            for entry in sorted(os.listdir(path)):
+                if not entry.startswith(corpus_store.DISTRICT + '='):
+                    continue
+                district = entry.split('=', 1)[1]
+                directory = corpus_store.district_dir(path, district)
+                filters = [(corpus_store.DISTRICT, '==', district)]
+                yield (f'{os.path.abspath(path)}#{entry}', district,
+                       lambda previous, directory=directory: _check_district(directory, previous),
+                       lambda path=path, filters=filters: corpus_store.iter_frames(
+                           path, ['PDF Name', 'Extracted Text'], filters, CHUNK_ROWS))
+        else:
+            yield (os.path.abspath(path), corpus_store.district_name(path),
+                   lambda previous, path=path: _check_csv(path, previous),
+                   lambda path=path: pd.read_csv(path, usecols=['PDF Name', 'Extracted Text'], chunksize=CHUNK_ROWS))
+
+def add_sources(inputs, index_dir=DEFAULT_INDEX_DIR, rebuild=False):
+    """Index new or changed sources, replacing the segment of any source indexed before.
+
+    A CSV whose size and mtime are unchanged (or, failing that, whose sha256
+    is) is skipped, as is a store district whose part files are unchanged.
+    Returns the number of segments written and skipped.
+    """
+    if rebuild:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = _read_manifest(index_dir)
+    totals = {'written': 0, 'skipped': 0}
+    for source, district, check_fn, frames_fn in iter_sources(inputs):
+        entries = {entry['source']: entry for entry in manifest['segments']}
+        previous = entries.get(source)
+        state, signature = check_fn(previous)
+        if state != 'changed':
+            if state == 'touched':
+                previous.update(signature)
+                _write_manifest(index_dir, manifest)
+            totals['skipped'] += 1
+            continue
+
+        start = time.perf_counter()
+        names, texts = [], []
+        for frame in frames_fn():
+            names.extend(frame['PDF Name'].astype(str))
+            texts.extend(frame['Extracted Text'])
+        name = f'seg-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+        # Written under an ignored name and renamed, like corpus store parts
+        tmp = os.path.join(index_dir, '.' + name)
+        stats = Segment.write(tmp, names, texts)
+        os.replace(tmp, os.path.join(index_dir, name))
+        entry = {'name': name, 'source': source, 'district': district, **signature, **stats}
+        manifest['segments'] = [e for e in manifest['segments'] if e['source'] != source] + [entry]
+        _write_manifest(index_dir, manifest)
+        if previous:
+            shutil.rmtree(os.path.join(index_dir, previous['name']), ignore_errors=True)
+        totals['written'] += 1
+        print(f"Indexed {stats['docs']} documents from {source} ({stats['terms']} terms, "
+              f"{stats['bytes'] / 1e6:.1f} MB of postings) in {time.perf_counter() - start:.2f}s")
+    return totals
+
+class SearchIndex:
+    """Ranked AND search over every segment of an index directory.
+
+    The manifest is checked on each query (one stat call), so segments added
+    by search_index.py while the server runs are picked up without a restart.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, history=1000):
+        if not os.path.exists(os.path.join(index_dir, MANIFEST)):
+            raise FileNotFoundError(f"No search index in {index_dir}; build one with search_index.py --input")
+        self.index_dir = index_dir
+        self.segments = []
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=history)
+        self._queries = 0
+        self.refresh()
+
+    def refresh(self):
+        mtime_ns = os.stat(os.path.join(self.index_dir, MANIFEST)).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return
+            loaded = {segment.name: segment for segment in self.segments}
+            entries = _read_manifest(self.index_dir)['segments']
+            self.segments = [loaded.get(entry['name']) or Segment(os.path.join(self.index_dir, entry['name']), entry)
+                             for entry in entries]
+            self._mtime_ns = mtime_ns
+
+    def search(self, query, limit=10, districts=None):
+        """Best matches for documents containing every term of query, by BM25 score.
+
+        Returns (hits, total): hits are dicts of PDF Name, district and score,
+        best first; total counts every matching document.
+        """
+        start = time.perf_counter()
+        self.refresh()
+        segments = self.segments
+        terms = list(dict.fromkeys(tokenize(query, query=True)))
+        hits, total = [], 0
+        # Collection statistics cover the whole index, so scores do not depend on the district filter
+        n_docs = sum(len(segment) for segment in segments)
+        doc_freqs = [sum(segment.doc_freq(term) for segment in segments) for term in terms]
+        if terms and all(doc_freqs):
+            avg_length = sum(int(segment.lengths.sum()) for segment in segments) / n_docs
+            idf = {term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) for term, df in zip(terms, doc_freqs)}
+            candidates = []
+            for segment in segments:
+                if districts and segment.district not in districts:
+                    continue
+                if not all(segment.doc_freq(term) for term in terms):
+                    continue
+                # Dense per-document accumulators: postings are scattered in,
+                # and the documents every term reached are the matches
+                matched = np.zeros(len(segment), dtype=np.int32)
+                scores = np.zeros(len(segment))
+                norm = K1 * (1 - B + B * segment.lengths / avg_length)
+                for term in terms:
+                    docs = segment.docs(term)
+                    tf = segment.term_freqs(term)
+                    matched[docs] += 1
+                    scores[docs] += idf[term] * tf * (K1 + 1) / (tf + norm[docs])
+                docs = np.flatnonzero(matched == len(terms))
+                scores = scores[docs]
+                total += len(docs)
+                best = np.argpartition(-scores, limit)[:limit] if len(scores) > limit else np.arange(len(scores))
+                candidates.extend((float(scores[i]), segment, int(docs[i])) for i in best)
+            candidates.sort(key=lambda candidate: -candidate[0])
+            hits = [{'pdf_name': segment.names[doc], 'district': segment.district, 'score': round(score, 4)}
+                    for score, segment, doc in candidates[:limit]]
+        self._latencies.append(time.perf_counter() - start)
+        self._queries += 1
+        return hits, total
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        def percentile(pct):
+            return round(1000 * latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))], 3) if latencies else 0.0
+        return {
+            'segments': len(self.segments),
+            'documents': sum(len(segment) for segment in self.segments),
+            'queries': self._queries,
+            'latency_ms_p50': percentile(50),
+            'latency_ms_p95': percentile(95),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query a full-text index of the scraped orders.")
+    parser.add_argument('--input', nargs='*', help=f"CSVs or corpus stores to add (default: every {DEFAULT_PATTERN})")
+    parser.add_argument('--index', default=DEFAULT_INDEX_DIR, help="index directory")
+    parser.add_argument('--rebuild', action='store_true', help="discard the index and add every input again")
+    parser.add_argument('--query', help="search the index instead of adding to it")
+    parser.add_argument('--district', nargs='+', help="only return documents from these districts")
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.query:
+        index = SearchIndex(args.index)
+        hits, total = index.search(args.query, args.limit, args.district)
+        for hit in hits:
+            print(f"{hit['score']:8.3f}  {hit['district']}  {hit['pdf_name']}")
+        print(f"{total} documents match {tokenize(args.query, query=True)} ({index.stats()['latency_ms_p50']:.2f} ms)")
+    else:
+        start = time.perf_counter()
+        totals = add_sources(args.input or sorted(glob.glob(DEFAULT_PATTERN)), args.index, args.rebuild)
+        print(f"{totals['written']} sources indexed, {totals['skipped']} unchanged, "
+              f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,43 @@
+import os
+import csv
+import hashlib
+
+# Tools that re-run over the same input files (pdfScraper, combineDatasets,
+# search_index) keep a manifest entry per file with its size, mtime and sha256,
+# and only redo the work for files whose content changed.
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_entries(manifest_path, key='path'):
+    """Latest row per key of an append-only manifest CSV; later rows win."""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                entries[row[key]] = row
+    return entries
+
+def stat_matches(entry, stat):
+    """Whether a file's size and mtime are those its manifest entry recorded."""
+    return (entry is not None and int(entry['size']) == stat.st_size
+            and int(entry['mtime_ns']) == stat.st_mtime_ns)
+
+def check_file(path, entry=None):
+    """Compare a file with its last manifest entry; returns (state, stat, sha256).
+
+    state is 'unchanged' when size and mtime match (the file is not read and
+    sha256 is the entry's), 'touched' when only the mtime moved and the content
+    hash is the same, and 'changed' for a new file or different content.
+    """
+    stat = os.stat(path)
+    if stat_matches(entry, stat):
+        return 'unchanged', stat, entry['sha256']
+    sha256 = file_sha256(path)
+    if entry is not None and entry['sha256'] == sha256:
+        return 'touched', stat, sha256
+    return 'changed', stat, sha256
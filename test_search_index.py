@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+import search_index
+
+DOCUMENTS = {
+    'amount.pdf': "The Tribunal awards compensation of Rs.500000/- to the claimant.",
+    'section.pdf': "The petition is filed under Section 166 of the Motor Vehicles Act.",
+    'subsection.pdf': "Claim petition u/s 166(1) of the M.V. Act.",
+    'vehicle.pdf': "The offending truck bearing registration TN23AB1234 was insured.",
+    'case.pdf': "IN THE COURT OF THE MOTOR ACCIDENT CLAIMS TRIBUNAL, MACT 58/2015.",
+    'policy.pdf': "Policy No. 2304-51234567-00-000 was in force on the date of accident.",
+}
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    root = tmp_path_factory.mktemp('search')
+    source = root / 'Testdistrict-pdf-data.csv'
+    pd.DataFrame({'PDF Name': list(DOCUMENTS), 'Extracted Text': list(DOCUMENTS.values())}).to_csv(source, index=False)
+    search_index.add_sources([str(source)], str(root / 'index'))
+    return search_index.SearchIndex(str(root / 'index'))
+
+@pytest.mark.parametrize('query, expected', [
+    ("Rs. 5,00,000", {'amount.pdf'}),
+    ("Rs 500000", {'amount.pdf'}),
+    ("u/s 166", {'section.pdf', 'subsection.pdf'}),
+    ("Section 166(1)", {'subsection.pdf'}),
+    ("TN-23-AB-1234", {'vehicle.pdf'}),
+    ("tn 23 ab 1234", {'vehicle.pdf'}),
+    ("M.A.C.T. No. 58 of 2015", {'case.pdf'}),
+    ("2304/51234567/00/000", {'policy.pdf'}),
+    ("truck", {'vehicle.pdf'}),
+])
+def test_references_match_any_spelling(index, query, expected):
+    hits, total = index.search(query, limit=10)
+    assert {hit['pdf_name'] for hit in hits} == expected
+    assert total == len(expected)
+
+def test_plain_words_still_required(index):
+    hits, total = index.search("Section 166 truck")
+    assert total == 0